@@ -1,6 +1,8 @@
 import os
 import sys
 
+import pytest
+
 root_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 sys.path.append(root_dir)
 
@@ -30,3 +32,38 @@ pytest_plugins = [
     "tests.fixtures.fixture_user",
     "tests.fixtures.fixture_data",
 ]
+
+
+@pytest.fixture(autouse=True, scope="session")
+def scratch_cache(tmp_path_factory):
+    """Тесты чистят кеш, поэтому работают с временным файлом, а не с
+    общим кешем воркеров."""
+    from django.conf import settings
+    from django.test import override_settings
+
+    location = tmp_path_factory.mktemp("cache") / "cache.sqlite3"
+    caches = {
+        "default": {**settings.CACHES["default"], "LOCATION": str(location)}
+    }
+    with override_settings(CACHES=caches):
+        yield
+
+
+@pytest.fixture(autouse=True)
+def clear_cache():
+    """Кеш общий и живёт в файле, поэтому каждый тест начинает с пустого."""
+    from django.core.cache import cache
+
+    cache.clear()
+
+
+@pytest.fixture(autouse=True)
+def inline_thumbnails(settings):
+    """Фоновый воркер миниатюр не должен пережить тест и его базу."""
+    settings.THUMBNAIL_WORKERS = 0
+
+
+@pytest.fixture(autouse=True)
+def inline_page_refresh(settings):
+    """Страницы обновляются в самом запросе, а не в фоновом потоке."""
+    settings.FEED_REFRESH_WORKERS = 0
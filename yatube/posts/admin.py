@@ -1,5 +1,6 @@
 from django.contrib import admin
 
+from . import search
 from .models import Group, Post
 
 
@@ -9,6 +10,13 @@ class PostAdmin(admin.ModelAdmin):
     list_filter = ("pub_date",)
     empty_value_display = "-пусто-"
 
+    def get_search_results(self, request, queryset, search_term):
+        # search_fields лишь включает поле поиска, ищем по индексу FTS5.
+        expression = search.match_expression(search_term)
+        if expression is None:
+            return queryset, False
+        return search.matching(queryset, expression), False
+
 
 class GroupAdmin(admin.ModelAdmin):
     list_display = ("pk", "title", "slug", "description")
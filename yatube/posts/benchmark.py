@@ -0,0 +1,202 @@
+"""Замеры задержки и числа SQL-запросов основных представлений.
+
+Запросы идут через тестовый клиент Django по текущей базе, которую
+заранее наполняет ``posts.seeding``. Команда ``manage.py benchmark``
+повторяет замеры на базах разного размера и пишет итоги в JSON.
+"""
+
+import itertools
+import math
+import time
+
+from django.db import connection
+from django.db.models import Max, Min
+from django.test import Client
+from django.test.utils import CaptureQueriesContext, override_settings
+from django.urls import reverse
+
+from .models import Group, Post, User
+from .seeding import WORDS
+
+# Изменяющие представления идут последними: они сбрасывают кеш лент.
+VIEWS = (
+    "index",
+    "group_posts",
+    "profile",
+    "post_view",
+    "follow_index",
+    "add_comment",
+    "new_post",
+)
+# Страницы, которые читают анонимы.
+ANONYMOUS_VIEWS = ("index", "group_posts", "profile", "post_view")
+# Номера страниц ленты и их веса: первые страницы смотрят чаще.
+PAGES = (1, 2, 3, 4, 5)
+PAGE_WEIGHTS = (16, 8, 4, 2, 1)
+READERS = 20
+# Разница в задержке меньше этой считается шумом, а не регрессией.
+NOISE_MS = 1.0
+
+
+def percentile(values, fraction):
+    """Значение по методу ближайшего ранга."""
+    ordered = sorted(values)
+    return ordered[max(math.ceil(fraction * len(ordered)) - 1, 0)]
+
+
+class Scenario:
+    """Случайные запросы к представлениям по данным текущей базы."""
+
+    def __init__(self, rng):
+        self.rng = rng
+        self.guest = Client()
+        self.groups = list(Group.objects.values_list("pk", "slug"))
+        self.authors = list(
+            User.objects.filter(stats__posts_count__gt=0).values_list(
+                "username", flat=True
+            )
+        )
+        bounds = Post.objects.aggregate(low=Min("pk"), high=Max("pk"))
+        self.post_ids = (bounds["low"], bounds["high"])
+        readers = User.objects.filter(stats__following_count__gt=0)
+        self.readers = []
+        for user in readers.order_by("pk")[:READERS]:
+            client = Client()
+            client.force_login(user)
+            self.readers.append(client)
+
+    def _page(self, url):
+        page = self.rng.choices(PAGES, weights=PAGE_WEIGHTS)[0]
+        return url if page == 1 else f"{url}?page={page}"
+
+    def _post(self):
+        pk = self.rng.randint(*self.post_ids)
+        return (
+            Post.objects.filter(pk__gte=pk)
+            .order_by("pk")
+            .values_list("pk", "author__username")
+            .first()
+        )
+
+    def _text(self):
+        return " ".join(self.rng.choices(WORDS, k=12))
+
+    def request(self, view):
+        """Клиент, метод, адрес и данные очередного запроса к ``view``."""
+        rng = self.rng
+        if view == "index":
+            return self.guest, "get", self._page(reverse("index")), None
+        if view == "group_posts":
+            _, slug = rng.choice(self.groups)
+            url = reverse("group_posts", kwargs={"slug": slug})
+            return self.guest, "get", self._page(url), None
+        if view == "profile":
+            username = rng.choice(self.authors)
+            url = reverse("profile", kwargs={"username": username})
+            return self.guest, "get", self._page(url), None
+        if view == "post_view":
+            pk, username = self._post()
+            url = reverse("post", kwargs={"username": username, "post_id": pk})
+            return self.guest, "get", url, None
+        reader = rng.choice(self.readers)
+        if view == "follow_index":
+            return reader, "get", self._page(reverse("follow_index")), None
+        if view == "add_comment":
+            pk, username = self._post()
+            url = reverse(
+                "add_comment", kwargs={"username": username, "post_id": pk}
+            )
+            return reader, "post", url, {"text": self._text()}
+        if view == "new_post":
+            group_id, _ = rng.choice(self.groups)
+            data = {"text": self._text(), "group": group_id}
+            return reader, "post", reverse("new_post"), data
+        raise ValueError(f"Неизвестное представление: {view}")
+
+
+def measure(scenario, view, requests, warmup=0):
+    """Задержки в миллисекундах и число SQL-запросов по ``requests``
+    обращениям к ``view`` после ``warmup`` неучитываемых."""
+    latencies, queries = [], []
+    for i in range(warmup + requests):
+        client, method, url, data = scenario.request(view)
+        with CaptureQueriesContext(connection) as captured:
+            start = time.perf_counter()
+            response = getattr(client, method)(url, data)
+            elapsed = time.perf_counter() - start
+        if response.status_code not in (200, 302):
+            raise RuntimeError(f"{url}: ответ {response.status_code}")
+        if i >= warmup:
+            latencies.append(elapsed * 1000)
+            queries.append(len(captured))
+    return {
+        "requests": requests,
+        "p50_ms": round(percentile(latencies, 0.5), 2),
+        "p99_ms": round(percentile(latencies, 0.99), 2),
+        "queries_p50": percentile(queries, 0.5),
+        "queries_max": max(queries),
+    }
+
+
+def run(scenario, requests, warmup=0, views=VIEWS):
+    return {view: measure(scenario, view, requests, warmup) for view in views}
+
+
+def _throughput(urls, fast_path):
+    with override_settings(ANONYMOUS_FAST_PATH=fast_path):
+        # Middleware собираются при первом запросе нового клиента.
+        client = Client()
+        start = time.perf_counter()
+        for url in urls:
+            response = client.get(url)
+            if response.status_code != 200:
+                raise RuntimeError(f"{url}: ответ {response.status_code}")
+        elapsed = time.perf_counter() - start
+    return round(len(urls) / elapsed, 1)
+
+
+def anonymous_throughput(scenario, requests):
+    """Запросов в секунду от анонимов без cookie через быстрый путь
+    (``yatube.anonymous``) и через полный стек middleware.
+
+    Оба прогона обходят одни и те же адреса по прогретому кешу страниц,
+    так что разница между ними — цена самих middleware.
+    """
+    views = itertools.islice(itertools.cycle(ANONYMOUS_VIEWS), requests)
+    urls = [scenario.request(view)[2] for view in views]
+    _throughput(urls, fast_path=False)
+    full_stack = _throughput(urls, fast_path=False)
+    fast_path = _throughput(urls, fast_path=True)
+    return {
+        "full_stack_rps": full_stack,
+        "fast_path_rps": fast_path,
+        "speedup": round(fast_path / full_stack, 2),
+    }
+
+
+def compare(results, baseline, tolerance):
+    """Регрессии относительно ``baseline``: строки с описанием.
+
+    Задержка считается выросшей, если она больше базовой более чем на
+    долю ``tolerance`` и на ``NOISE_MS``; число запросов не должно расти
+    вовсе.
+    """
+    regressions = []
+    for size, views in results.items():
+        for view, current in views.items():
+            base = baseline.get(size, {}).get(view)
+            if base is None:
+                continue
+            for metric in ("p50_ms", "p99_ms"):
+                grown = current[metric] - base[metric]
+                if grown > base[metric] * tolerance and grown > NOISE_MS:
+                    regressions.append(
+                        f"{size} {view} {metric}: "
+                        f"{base[metric]} -> {current[metric]}"
+                    )
+            if current["queries_max"] > base["queries_max"]:
+                regressions.append(
+                    f"{size} {view} queries_max: "
+                    f"{base['queries_max']} -> {current['queries_max']}"
+                )
+    return regressions
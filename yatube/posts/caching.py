@@ -0,0 +1,620 @@
+import collections
+import copy
+import gzip
+import hashlib
+import logging
+import math
+import random
+import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from functools import wraps
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import DatabaseError, connection, transaction
+from django.dispatch import Signal
+from django.utils.cache import (
+    get_conditional_response,
+    patch_cache_control,
+    patch_vary_headers,
+)
+from django.utils.http import http_date
+from django.utils.text import compress_string
+
+from .local_cache import LocalCache
+
+logger = logging.getLogger(__name__)
+
+# Страницы помечены тегами объектов, которые на них видны; изменение
+# объекта сбрасывает (``purge``) все страницы с его тегом. Те же теги
+# уходят в заголовке Surrogate-Key, чтобы обратный прокси мог сбрасывать
+# свои копии страниц так же.
+
+# Меняется, когда в ленте появляется или исчезает пост: нумерованные
+# страницы сдвигаются, а курсорные страницы ``?after=`` остаются прежними.
+FEED_TAG = "feed"
+
+# После коммита сброса, аргумент ``tags`` — сброшенные теги.
+tags_purged = Signal(providing_args=["tags"])
+
+# Поднимается при изменении разметки posts/post_item.html.
+CARD_TEMPLATE_VERSION = 2
+# Ключ карточки сам меняется вместе с содержимым, таймаут лишь
+# освобождает память от карточек, которые давно не показывались.
+CARD_TIMEOUT = 60 * 60 * 24
+
+# Поднимается при изменении формата закешированной страницы.
+PAGE_ENTRY_VERSION = 4
+# Страницы не меньше стольких байт хранятся сжатыми gzip и так и
+# отдаются клиентам, которые его принимают.
+PAGE_COMPRESS_MIN_SIZE = 1024
+_accepts_gzip = re.compile(r"\bgzip\b")
+
+# Сколько секунд держится блокировка пересчёта, если пересчитывающий
+# запрос упал, не сняв её.
+LOCK_TIMEOUT = 30
+# Насколько рано пересчитываются значения с таймаутом: чем больше, тем
+# раньше срока и чаще (XFetch, Vattani et al.).
+EARLY_RECOMPUTE_BETA = 1.0
+
+# События кешей: значение свежее, его нет, устаревшее отдано, пока
+# другой запрос его пересчитывает, значение пересчитано.
+STATS_EVENTS = ("hit", "miss", "stale", "recompute")
+STATS_NAMES_KEY = "stats:names"
+# Счётчики копятся в процессе и сбрасываются в общий кеш не чаще, чем
+# раз в столько секунд, чтобы чтение из кеша не стоило записи.
+STATS_FLUSH_INTERVAL = 5
+
+_stats = collections.Counter()
+_stats_lock = threading.Lock()
+_stats_flushed = time.monotonic()
+
+_executor = None
+
+# Уже распакованные страницы в памяти процесса: самые частые чтения не
+# уходят в общий кеш дальше сверки версий.
+local_cache = LocalCache(
+    settings.LOCAL_CACHE_MAX_SIZE, settings.LOCAL_CACHE_TIMEOUT
+)
+
+
+def post_tag(pk):
+    """Запись и всё, что видно на её карточке."""
+    return f"post:{pk}"
+
+
+def comments_tag(pk):
+    """Комментарии к записи."""
+    return f"comments:{pk}"
+
+
+def group_tag(pk):
+    """Заголовок и описание группы."""
+    return f"group:{pk}"
+
+
+def author_tag(pk):
+    """Профиль пользователя и его счётчики."""
+    return f"author:{pk}"
+
+
+def author_name_tag(pk):
+    """Имя пользователя на карточках его записей в лентах."""
+    return f"author:{pk}:name"
+
+
+def group_feed_tag(pk):
+    """Меняется, когда в группе появляется или исчезает запись."""
+    return f"group:{pk}:feed"
+
+
+# Растёт при каждом сбросе любого тега: так видно, что сброс пришёлся
+# на отрисовку страницы (см. ``_store``).
+PURGE_SEQUENCE_KEY = "tag:purges"
+# Версия, которой у тега не бывает: запись с ней сразу устаревшая.
+STALE_VERSION = -1
+
+
+def _version_key(tag):
+    return f"tag:{tag}"
+
+
+def _incr(key, delta=1):
+    try:
+        cache.incr(key, delta)
+    except ValueError:
+        if not cache.add(key, delta, timeout=None):
+            cache.incr(key, delta)
+
+
+def _purge_sequence():
+    return cache.get(PURGE_SEQUENCE_KEY, 0)
+
+
+def _purge_now(tags):
+    # Последовательность меняется раньше версий тегов: кто прочитал
+    # новые версии, увидит и сдвинутую последовательность.
+    _incr(PURGE_SEQUENCE_KEY)
+    for tag in tags:
+        _incr(_version_key(tag))
+
+
+def _purge_committed(tags):
+    _purge_now(tags)
+    tags_purged.send(sender=None, tags=tags)
+
+
+def purge(*tags):
+    """Сбросить страницы, помеченные любым из ``tags``.
+
+    Страница хранит версии своих тегов, и purge меняет их сразу и ещё
+    раз после коммита. Версии страница читает уже после отрисовки, так
+    что страница, отрисованная по данным до коммита, получила бы новые
+    версии; поэтому purge сдвигает и общую последовательность сбросов, а
+    страница, во время отрисовки которой она сдвинулась, сохраняется уже
+    устаревшей. После коммита о сброшенных тегах сообщает
+    ``tags_purged``.
+    """
+    _purge_now(tags)
+    transaction.on_commit(lambda: _purge_committed(tags))
+
+
+def feed_tags(request, page, list_tag=FEED_TAG):
+    """Теги страницы ленты.
+
+    ``list_tag`` — тег списка записей ленты; ``None``, если
+    представление добавляет его само.
+    """
+    tags = {post_tag(post.pk) for post in page}
+    tags.update(group_tag(post.group_id) for post in page if post.group_id)
+    tags.update(author_name_tag(post.author_id) for post in page)
+    if list_tag is not None and "after" not in request.GET:
+        tags.add(list_tag)
+    return sorted(tags)
+
+
+def card_key(post):
+    """Ключ HTML карточки поста: меняется вместе со всем, что в ней видно.
+
+    Ожидает пост из ``Post.objects.for_feed()`` с подгруженными автором и
+    группой.
+    """
+    group = post.group
+    digest = hashlib.md5(
+        "|".join(
+            (
+                post.author.username,
+                group.slug if group else "",
+                group.title if group else "",
+            )
+        ).encode()
+    ).hexdigest()[:12]
+    return (
+        f"post_card:{CARD_TEMPLATE_VERSION}:{post.pk}:"
+        f"{post.updated.timestamp()}:{digest}:{post.comment_count}"
+    )
+
+
+def _stats_key(name, event):
+    return f"stats:{name}:{event}"
+
+
+def _count(name, event):
+    with _stats_lock:
+        _stats[name, event] += 1
+        due = time.monotonic() - _stats_flushed >= STATS_FLUSH_INTERVAL
+    if due:
+        flush_stats()
+
+
+def flush_stats():
+    """Перенести счётчики процесса в общий кеш."""
+    global _stats_flushed
+    with _stats_lock:
+        pending = dict(_stats)
+        _stats.clear()
+        _stats_flushed = time.monotonic()
+    if not pending:
+        return
+    names = {name for name, _ in pending}
+    known = cache.get(STATS_NAMES_KEY, set())
+    if not names <= known:
+        cache.set(STATS_NAMES_KEY, known | names, timeout=None)
+    for (name, event), count in pending.items():
+        _incr(_stats_key(name, event), count)
+
+
+def cache_stats():
+    """Счётчики всех процессов: ``{кеш: {событие: число}}``."""
+    flush_stats()
+    names = sorted(cache.get(STATS_NAMES_KEY, set()))
+    values = cache.get_many(
+        [_stats_key(name, event) for name in names for event in STATS_EVENTS]
+    )
+    return {
+        name: {
+            event: values.get(_stats_key(name, event), 0)
+            for event in STATS_EVENTS
+        }
+        for name in names
+    }
+
+
+def _lock(key):
+    """Взять пересчёт ``key`` на себя; False, если он уже идёт."""
+    return cache.add(f"lock:{key}", 1, timeout=LOCK_TIMEOUT)
+
+
+def _unlock(key):
+    cache.delete(f"lock:{key}")
+
+
+def early_cached(name, key, compute, timeout):
+    """Значение ``compute()`` из кеша с защитой от одновременного пересчёта.
+
+    Незадолго до срока значение с вероятностью, растущей к сроку и со
+    временем вычисления, пересчитывается заранее, и только одним
+    запросом: остальные, пока он считает, получают прежнее.
+    """
+    entry = cache.get(key)
+    if entry is None:
+        _count(name, "miss")
+    else:
+        value, duration, expires = entry
+        early = (
+            duration * EARLY_RECOMPUTE_BETA * -math.log(1 - random.random())
+        )
+        if time.time() + early < expires:
+            _count(name, "hit")
+            return value
+        if not _lock(key):
+            _count(name, "stale")
+            return value
+        _count(name, "recompute")
+    try:
+        start = time.time()
+        value = compute()
+        now = time.time()
+        cache.set(key, (value, now - start, now + timeout), timeout=timeout)
+    finally:
+        if entry is not None:
+            _unlock(key)
+    return value
+
+
+def cached_count(queryset):
+    """COUNT(*) queryset, отстающий не дольше PAGINATOR_COUNT_TIMEOUT."""
+    queryset = queryset.order_by()
+    digest = hashlib.md5(str(queryset.query).encode()).hexdigest()
+    # v2: в значении кроме числа лежат время вычисления и срок.
+    key = f"count:v2:{digest}"
+    return early_cached(
+        "count", key, queryset.count, settings.PAGINATOR_COUNT_TIMEOUT
+    )
+
+
+def _page_key(key_prefix, request):
+    path = hashlib.md5(request.get_full_path().encode()).hexdigest()
+    return (
+        f"{key_prefix}:{PAGE_ENTRY_VERSION}:"
+        f"{request.user.pk or 'anon'}:{path}"
+    )
+
+
+def _versions(tags):
+    current = cache.get_many([_version_key(tag) for tag in tags])
+    return {tag: current.get(_version_key(tag)) for tag in tags}
+
+
+def _is_current(versions):
+    return _versions(versions) == versions
+
+
+def _stamped_versions(tags):
+    """Версии тегов для новой записи страницы.
+
+    Тегу без версии назначается случайная: иначе после очистки или
+    вытеснения общего кеша версии начались бы заново и совпали бы с
+    версиями страниц, оставшихся в памяти процессов. Если два процесса
+    назначат версию одновременно, страница одного из них лишь будет
+    пересчитана лишний раз.
+    """
+    versions = _versions(tags)
+    missing = {
+        _version_key(tag): random.getrandbits(48)
+        for tag, version in versions.items()
+        if version is None
+    }
+    if missing:
+        cache.set_many(missing, timeout=None)
+        versions = _versions(tags)
+    return versions
+
+
+def _copy_response(response):
+    """Копия ответа, которую запрос может менять, не трогая оригинал.
+
+    Middleware добавляют ответу заголовки и cookie, а WSGI-обработчик —
+    объекты для закрытия; содержимое копии общее с оригиналом.
+    """
+    clone = copy.copy(response)
+    clone._headers = response._headers.copy()
+    clone.cookies = copy.deepcopy(response.cookies)
+    clone._closable_objects = []
+    return clone
+
+
+def _compressed(response):
+    """Копия ответа с телом в gzip или сам ответ, если он мал."""
+    if response.has_header("Content-Encoding"):
+        return response
+    if len(response.content) < PAGE_COMPRESS_MIN_SIZE:
+        return response
+    clone = _copy_response(response)
+    clone.content = compress_string(response.content)
+    clone["Content-Encoding"] = "gzip"
+    return clone
+
+
+def _for_client(request, response):
+    """Ответ из кеша в кодировке, которую принимает клиент.
+
+    Сжатый ответ отдаётся как есть, а клиенту без gzip — распакованная
+    копия.
+    """
+    accepted = request.META.get("HTTP_ACCEPT_ENCODING", "")
+    compressed = response.get("Content-Encoding") == "gzip"
+    if not compressed or _accepts_gzip.search(accepted):
+        return response
+    clone = _copy_response(response)
+    clone.content = gzip.decompress(response.content)
+    del clone["Content-Encoding"]
+    return clone
+
+
+def _remember(key, entry):
+    versions, response, stored = entry
+    local_cache.set(
+        key,
+        (versions, _copy_response(response), stored),
+        len(response.content),
+    )
+
+
+def _local_page(request, key):
+    """Копия свежей страницы из памяти процесса или None."""
+    entry = local_cache.get(key)
+    if entry is not None and _is_current(entry[0]):
+        return _for_client(request, _copy_response(entry[1]))
+    return None
+
+
+def _store(key, response, sequence):
+    """Сохранить страницу, отрисовку которой начали при ``sequence``.
+
+    Если с тех пор что-то сбросили, страница могла прочитать данные до
+    коммита сброса: она сохраняется устаревшей и отдаётся, только пока
+    её пересчитывают.
+    """
+    tags = getattr(response, "cache_tags", None)
+    if response.status_code == 200 and tags is not None:
+        response["Surrogate-Key"] = " ".join(tags)
+        patch_vary_headers(response, ("Accept-Encoding",))
+        versions = _stamped_versions(tags)
+        if _purge_sequence() != sequence:
+            versions = dict.fromkeys(versions, STALE_VERSION)
+        entry = (versions, _compressed(response), time.time())
+        cache.set(key, entry, timeout=None)
+        _remember(key, entry)
+
+
+def _stale(response):
+    response["X-Cache"] = "STALE"
+    return response
+
+
+def get_executor():
+    """Потоки фоновой работы кеша: обновление страниц и сброс прокси."""
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(
+            max_workers=settings.FEED_REFRESH_WORKERS,
+            thread_name_prefix="feed-refresh",
+        )
+    return _executor
+
+
+def _detached(request):
+    """Копия запроса для фонового пересчёта.
+
+    Своя META, чтобы CSRF-cookie фонового рендера не попала в ответ
+    исходного запроса, и пустые сообщения, чтобы не забрать их у него.
+    """
+    clone = copy.copy(request)
+    clone.META = request.META.copy()
+    clone._messages = []
+    return clone
+
+
+def _refresh(key_prefix, key, view, request, args, kwargs):
+    try:
+        _count(key_prefix, "recompute")
+        sequence = _purge_sequence()
+        _store(key, view(request, *args, **kwargs), sequence)
+    except Exception:
+        logger.exception("Не удалось обновить страницу %s", request.path)
+    finally:
+        _unlock(key)
+        # Воркер живёт в своём потоке со своим соединением с БД.
+        connection.close()
+
+
+def _render_or_stale(view, request, args, kwargs, cached, stored):
+    """Пересчитанная страница, а при ошибке базы — прежняя ``cached``.
+
+    Прежняя отдаётся, только если она не старше FEED_STALE_IF_ERROR.
+    """
+    try:
+        return view(request, *args, **kwargs)
+    except DatabaseError:
+        if time.time() - stored > settings.FEED_STALE_IF_ERROR:
+            raise
+        logger.warning(
+            "Отдана устаревшая страница %s", request.path, exc_info=True
+        )
+        return _stale(cached)
+
+
+def _stale_since(key, stored):
+    """Когда запись страницы, отрисованную в ``stored``, впервые застали
+    устаревшей."""
+    mark = f"stale:{key}:{stored}"
+    now = time.time()
+    if cache.add(mark, now, timeout=settings.FEED_STALE_IF_ERROR):
+        return now
+    return cache.get(mark, now)
+
+
+def _revalidates_in_background(request, key, stored):
+    # Свои страницы пользователь видит сразу обновлёнными: например,
+    # только что опубликованную запись. Фоновое обновление — для общих
+    # страниц анонимов.
+    if not settings.FEED_REFRESH_WORKERS or request.user.is_authenticated:
+        return False
+    # Страница устаревает при сбросе тега, а не с возрастом: окно
+    # отсчитывается с первого чтения устаревшей записи.
+    stale_for = time.time() - _stale_since(key, stored)
+    return stale_for <= settings.FEED_STALE_WHILE_REVALIDATE
+
+
+def cache_feed_page(key_prefix):
+    """Кешировать страницу, пока не сброшен ни один из её тегов.
+
+    Представление сообщает теги через ``response.cache_tags`` (см.
+    ``feed_tags``); ответы без них не кешируются. Теги отдаются и в
+    заголовке Surrogate-Key.
+
+    Свежая страница отдаётся из памяти процесса (``local_cache``), если
+    она там есть: в общий кеш уходит только сверка версий тегов.
+    Страницы хранятся сжатыми gzip (см. ``PAGE_COMPRESS_MIN_SIZE``), и
+    клиенты, которые его принимают, получают их без повторного сжатия.
+    Устаревшую страницу пересчитывает один запрос, остальные тем временем
+    получают прежнюю. Аноним получает прежнюю страницу, даже если
+    пересчёт достался ему, — страница обновится в фоне. Если пересчёт
+    упал с ошибкой базы, отдаётся прежняя страница не старше
+    FEED_STALE_IF_ERROR. Устаревшие ответы помечены ``X-Cache: STALE``.
+    """
+
+    def decorator(view):
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            key = _page_key(key_prefix, request)
+            response = _local_page(request, key)
+            if response is not None:
+                _count(key_prefix, "hit")
+                return response
+            entry = cache.get(key)
+            if entry is None:
+                _count(key_prefix, "miss")
+                sequence = _purge_sequence()
+                response = view(request, *args, **kwargs)
+                _store(key, response, sequence)
+                return response
+
+            versions, cached, stored = entry
+            cached = _for_client(request, cached)
+            if _is_current(versions):
+                _count(key_prefix, "hit")
+                _remember(key, entry)
+                return cached
+            if not _lock(key):
+                _count(key_prefix, "stale")
+                return _stale(cached)
+            if _revalidates_in_background(request, key, stored):
+                _count(key_prefix, "stale")
+                get_executor().submit(
+                    _refresh,
+                    key_prefix,
+                    key,
+                    view,
+                    _detached(request),
+                    args,
+                    kwargs,
+                )
+                return _stale(cached)
+
+            _count(key_prefix, "recompute")
+            sequence = _purge_sequence()
+            try:
+                response = _render_or_stale(
+                    view, request, args, kwargs, cached, stored
+                )
+            finally:
+                _unlock(key)
+            if response is not cached:
+                _store(key, response, sequence)
+            return response
+
+        return wrapper
+
+    return decorator
+
+
+def conditional_page(validators):
+    """Отвечать 304, если страница не менялась с прошлого запроса клиента.
+
+    ``validators(request, *args, **kwargs)`` одним запросом по индексам
+    возвращает времена последних изменений всего, что видно на странице,
+    или ``None``, если объекта нет: тогда 404 отдаст само представление.
+    Пустые времена (например, у автора ещё нет записей) допустимы.
+    Из них и посетителя строятся ETag и Last-Modified, и 304 отдаётся
+    раньше кеша страниц и самого представления. Если запрос валидаторов
+    упал с ошибкой базы, страница отдаётся без них.
+    """
+
+    def decorator(view):
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            try:
+                versions = validators(request, *args, **kwargs)
+            except DatabaseError:
+                # Без валидаторов: кеш страниц отдаст прежнюю страницу,
+                # если база недоступна и для представления.
+                versions = None
+            if not versions or not any(versions):
+                return view(request, *args, **kwargs)
+            digest = hashlib.md5(
+                "|".join(
+                    [str(request.user.pk), str(CARD_TEMPLATE_VERSION)]
+                    + [str(version) for version in versions]
+                ).encode()
+            ).hexdigest()
+            etag = f'W/"{digest}"'
+            last_modified = max(filter(None, versions)).timestamp()
+
+            response = get_conditional_response(
+                request, etag=etag, last_modified=int(last_modified)
+            )
+            if response is None:
+                response = view(request, *args, **kwargs)
+                # Устаревшая страница не должна получить валидаторы свежей.
+                if (
+                    response.status_code != 200
+                    or response.get("X-Cache") == "STALE"
+                ):
+                    return response
+            response["ETag"] = etag
+            response["Last-Modified"] = http_date(last_modified)
+            # Хранить можно, но перед показом — сверяться с сервером;
+            # страницу пользователя — только в его браузере.
+            if request.user.is_authenticated:
+                patch_cache_control(response, no_cache=True, private=True)
+            else:
+                patch_cache_control(response, no_cache=True)
+            return response
+
+        return wrapper
+
+    return decorator
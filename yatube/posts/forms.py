@@ -1,6 +1,6 @@
 from django import forms
 
-from .models import Comment, Post
+from .models import Comment, Group, Post, User
 
 
 class PostForm(forms.ModelForm):
@@ -14,3 +14,32 @@ class CommentForm(forms.ModelForm):
         model = Comment
         fields = ("text",)
         widgets = {"text": forms.Textarea({"rows": 3})}
+
+
+class SearchForm(forms.Form):
+    q = forms.CharField(label="Найти", max_length=200, required=False)
+    group = forms.ModelChoiceField(
+        Group.objects.all(),
+        to_field_name="slug",
+        required=False,
+        label="Сообщество",
+    )
+    author = forms.CharField(label="Автор", max_length=150, required=False)
+
+    def clean_author(self):
+        username = self.cleaned_data["author"]
+        if not username:
+            return None
+        author = User.objects.filter(username=username).first()
+        if author is None:
+            raise forms.ValidationError("Нет такого автора.")
+        return author
+
+    def filters(self):
+        """Условия на колонки posts_post для ``search.ranked``."""
+        filters = {}
+        if self.cleaned_data["group"] is not None:
+            filters["group_id"] = self.cleaned_data["group"].pk
+        if self.cleaned_data["author"] is not None:
+            filters["author_id"] = self.cleaned_data["author"].pk
+        return filters
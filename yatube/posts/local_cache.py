@@ -0,0 +1,59 @@
+"""Кеш объектов в памяти процесса перед общим кешем.
+
+Значение из общего кеша при каждом чтении распаковывается из pickle, и
+для страниц это дороже самого чтения. ``LocalCache`` держит уже
+распакованные объекты недолго (``timeout`` секунд) и в пределах
+``max_size`` байт, вытесняя давно не читавшиеся. Размер значения
+сообщает тот, кто его кладёт.
+
+Об изменениях в других процессах локальный кеш не знает, поэтому в нём
+держат значения, которые под своим ключом не меняются или сверяются
+перед использованием: страницы — по версиям тегов.
+"""
+
+import collections
+import threading
+import time
+
+
+class LocalCache:
+    def __init__(self, max_size, timeout):
+        self.max_size = max_size
+        self.timeout = timeout
+        # Ключ -> (значение, размер, срок); в начале — давно не читанные.
+        self._entries = collections.OrderedDict()
+        self._size = 0
+        # Фоновые потоки обновления страниц пишут в тот же кеш.
+        self._lock = threading.Lock()
+
+    def _remove(self, key):
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self._size -= entry[1]
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            value, _, expires = entry
+            if expires <= time.monotonic():
+                self._remove(key)
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key, value, size):
+        with self._lock:
+            self._remove(key)
+            if size > self.max_size:
+                return
+            self._entries[key] = (value, size, time.monotonic() + self.timeout)
+            self._size += size
+            while self._size > self.max_size:
+                self._remove(next(iter(self._entries)))
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._size = 0
@@ -0,0 +1,131 @@
+import contextlib
+import json
+import os
+import platform
+import random
+import shutil
+import tempfile
+
+import django
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test.utils import (
+    override_settings,
+    setup_test_environment,
+    teardown_test_environment,
+)
+from django.utils import timezone
+
+from posts import benchmark, seeding
+
+
+@contextlib.contextmanager
+def scratch_environment():
+    """Отдельные база и кеш во временном каталоге вместо рабочих."""
+    directory = tempfile.mkdtemp()
+    test_settings = connection.settings_dict.setdefault("TEST", {})
+    old_test_name = test_settings.get("NAME")
+    test_settings["NAME"] = os.path.join(directory, "db.sqlite3")
+    old_name = connection.settings_dict["NAME"]
+    caches = {
+        "default": {
+            **settings.CACHES["default"],
+            "LOCATION": os.path.join(directory, "cache.sqlite3"),
+        }
+    }
+    setup_test_environment(debug=False)
+    try:
+        connection.creation.create_test_db(
+            verbosity=0, autoclobber=True, serialize=False
+        )
+        with override_settings(CACHES=caches, THUMBNAIL_WORKERS=0):
+            yield
+    finally:
+        connection.creation.destroy_test_db(old_name, verbosity=0)
+        test_settings["NAME"] = old_test_name
+        teardown_test_environment()
+        shutil.rmtree(directory, ignore_errors=True)
+
+
+class Command(BaseCommand):
+    help = (
+        "Замерить задержку и число SQL-запросов представлений и "
+        "пропускную способность быстрого пути анонимов на синтетических "
+        "базах разного размера."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--sizes",
+            type=int,
+            nargs="+",
+            default=[10_000, 100_000, 1_000_000],
+            help="Число записей в базах.",
+        )
+        parser.add_argument("--requests", type=int, default=200)
+        parser.add_argument("--warmup", type=int, default=20)
+        parser.add_argument("--seed", type=int, default=0)
+        parser.add_argument("--output", default="benchmark.json")
+        parser.add_argument(
+            "--baseline", help="JSON прошлого прогона для сравнения."
+        )
+        parser.add_argument(
+            "--tolerance",
+            type=float,
+            default=0.2,
+            help="Допустимый рост задержки, доля от базовой.",
+        )
+
+    def handle(self, *args, **options):
+        results, anonymous = {}, {}
+        for size in options["sizes"]:
+            with scratch_environment():
+                self.stdout.write(f"{size}: наполнение базы")
+                seeding.seed(size, seed=options["seed"])
+                self.stdout.write(f"{size}: замеры")
+                scenario = benchmark.Scenario(random.Random(options["seed"]))
+                results[str(size)] = benchmark.run(
+                    scenario, options["requests"], options["warmup"]
+                )
+                anonymous[str(size)] = benchmark.anonymous_throughput(
+                    scenario, options["requests"]
+                )
+            for view, stats in results[str(size)].items():
+                self.stdout.write(
+                    f"  {view:<14} p50 {stats['p50_ms']:>8} мс  "
+                    f"p99 {stats['p99_ms']:>8} мс  "
+                    f"запросов {stats['queries_p50']}..{stats['queries_max']}"
+                )
+            throughput = anonymous[str(size)]
+            self.stdout.write(
+                f"  анонимы: полный стек {throughput['full_stack_rps']} "
+                f"запр/с, быстрый путь {throughput['fast_path_rps']} запр/с "
+                f"(x{throughput['speedup']})"
+            )
+
+        report = {
+            "created": timezone.now().isoformat(),
+            "python": platform.python_version(),
+            "django": django.get_version(),
+            "requests": options["requests"],
+            "seed": options["seed"],
+            "results": results,
+            "anonymous": anonymous,
+        }
+        with open(options["output"], "w") as output:
+            json.dump(report, output, indent=2, ensure_ascii=False)
+        self.stdout.write(f"Результаты записаны в {options['output']}")
+
+        if options["baseline"]:
+            with open(options["baseline"]) as baseline:
+                base = json.load(baseline)["results"]
+            regressions = benchmark.compare(
+                results, base, options["tolerance"]
+            )
+            if regressions:
+                raise CommandError(
+                    "Регрессии относительно базового прогона:\n"
+                    + "\n".join(regressions)
+                )
+            self.stdout.write("Регрессий относительно базового прогона нет.")
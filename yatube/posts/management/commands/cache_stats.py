@@ -0,0 +1,24 @@
+from django.core.management.base import BaseCommand
+
+from posts import caching
+
+
+class Command(BaseCommand):
+    help = "Показать попадания, промахи и пересчёты кешей всех воркеров."
+
+    def handle(self, *args, **options):
+        stats = caching.cache_stats()
+        if not stats:
+            self.stdout.write("Счётчиков пока нет.")
+            return
+        self.stdout.write(
+            f"{'кеш':<14}"
+            + "".join(f"{event:>11}" for event in caching.STATS_EVENTS)
+        )
+        for name, counts in stats.items():
+            self.stdout.write(
+                f"{name:<14}"
+                + "".join(
+                    f"{counts[event]:>11}" for event in caching.STATS_EVENTS
+                )
+            )
@@ -0,0 +1,21 @@
+from django.core.management.base import BaseCommand
+
+from posts import thumbnails
+from posts.models import Post
+
+
+class Command(BaseCommand):
+    help = "Создать миниатюры для постов с картинкой, у которых их ещё нет."
+
+    def handle(self, *args, **options):
+        posts = (
+            Post.objects.exclude(image="")
+            .exclude(image__isnull=True)
+            .filter(thumbnail="")
+            .values_list("pk", flat=True)
+        )
+        done = 0
+        for post_id in posts.iterator():
+            thumbnails.generate(post_id)
+            done += 1
+        self.stdout.write(f"Миниатюр создано: {done}")
@@ -0,0 +1,45 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from posts import seeding
+
+
+class Command(BaseCommand):
+    help = (
+        "Наполнить базу синтетическими пользователями, группами, записями, "
+        "комментариями и подписками."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--posts", type=int, default=10_000)
+        parser.add_argument(
+            "--users", type=int, help="По умолчанию — одна двадцатая записей."
+        )
+        parser.add_argument("--groups", type=int)
+        parser.add_argument("--follows-per-user", type=int, default=10)
+        parser.add_argument("--comments-per-post", type=float, default=2)
+        parser.add_argument(
+            "--images",
+            type=int,
+            default=0,
+            help="Сколько разных картинок сгенерировать для записей.",
+        )
+        parser.add_argument("--image-share", type=float, default=0.1)
+        parser.add_argument("--seed", type=int, default=0)
+
+    def handle(self, *args, **options):
+        started = time.monotonic()
+        created = seeding.seed(
+            options["posts"],
+            users=options["users"],
+            groups=options["groups"],
+            follows_per_user=options["follows_per_user"],
+            comments_per_post=options["comments_per_post"],
+            images=seeding.generate_images(options["images"]),
+            image_share=options["image_share"],
+            seed=options["seed"],
+        )
+        for model, count in created.items():
+            self.stdout.write(f"{model}: {count}")
+        self.stdout.write(f"Готово за {time.monotonic() - started:.0f} с")
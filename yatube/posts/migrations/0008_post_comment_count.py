@@ -0,0 +1,48 @@
+# Generated by Django 2.2.28 on 2026-10-18 05:52
+
+from django.db import migrations, models, transaction
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+BATCH_SIZE = 5000
+
+
+def backfill_comment_count(apps, schema_editor):
+    Post = apps.get_model("posts", "Post")
+    Comment = apps.get_model("posts", "Comment")
+    comments = (
+        Comment.objects.filter(post=OuterRef("pk"))
+        .order_by()
+        .values("post")
+        .annotate(total=Count("pk"))
+        .values("total")
+    )
+    bounds = Post.objects.aggregate(
+        low=models.Min("pk"), high=models.Max("pk")
+    )
+    if bounds["low"] is None:
+        return
+    for start in range(bounds["low"], bounds["high"] + 1, BATCH_SIZE):
+        with transaction.atomic():
+            Post.objects.filter(
+                pk__gte=start, pk__lt=start + BATCH_SIZE
+            ).update(comment_count=Coalesce(Subquery(comments), 0))
+
+
+class Migration(migrations.Migration):
+    atomic = False
+
+    dependencies = [
+        ("posts", "0007_auto_20210619_0009"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="post",
+            name="comment_count",
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.RunPython(
+            backfill_comment_count, migrations.RunPython.noop
+        ),
+    ]
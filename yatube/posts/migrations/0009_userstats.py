@@ -0,0 +1,87 @@
+# Generated by Django 2.2.28 on 2026-10-18 05:54
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models, transaction
+from django.db.models import Count
+
+BATCH_SIZE = 5000
+
+
+def backfill_user_stats(apps, schema_editor):
+    User = apps.get_model(*settings.AUTH_USER_MODEL.split("."))
+    Post = apps.get_model("posts", "Post")
+    Follow = apps.get_model("posts", "Follow")
+    UserStats = apps.get_model("posts", "UserStats")
+
+    def counts(queryset, field, ids):
+        rows = (
+            queryset.filter(**{f"{field}__in": ids})
+            .order_by()
+            .values(field)
+            .annotate(total=Count("pk"))
+        )
+        return {row[field]: row["total"] for row in rows}
+
+    ids = list(User.objects.order_by("pk").values_list("pk", flat=True))
+    for start in range(0, len(ids), BATCH_SIZE):
+        batch = ids[start : start + BATCH_SIZE]
+        followers = counts(Follow.objects, "author", batch)
+        following = counts(Follow.objects, "user", batch)
+        posts = counts(Post.objects, "author", batch)
+        with transaction.atomic():
+            UserStats.objects.bulk_create(
+                UserStats(
+                    user_id=pk,
+                    followers_count=followers.get(pk, 0),
+                    following_count=following.get(pk, 0),
+                    posts_count=posts.get(pk, 0),
+                )
+                for pk in batch
+            )
+
+
+class Migration(migrations.Migration):
+    atomic = False
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ("posts", "0008_post_comment_count"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="UserStats",
+            fields=[
+                (
+                    "user",
+                    models.OneToOneField(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        primary_key=True,
+                        related_name="stats",
+                        serialize=False,
+                        to=settings.AUTH_USER_MODEL,
+                    ),
+                ),
+                (
+                    "followers_count",
+                    models.PositiveIntegerField(
+                        default=0, verbose_name="Подписчиков"
+                    ),
+                ),
+                (
+                    "following_count",
+                    models.PositiveIntegerField(
+                        default=0, verbose_name="Подписан"
+                    ),
+                ),
+                (
+                    "posts_count",
+                    models.PositiveIntegerField(
+                        default=0, verbose_name="Записей"
+                    ),
+                ),
+            ],
+        ),
+        migrations.RunPython(backfill_user_stats, migrations.RunPython.noop),
+    ]
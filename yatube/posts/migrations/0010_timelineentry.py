@@ -0,0 +1,103 @@
+# Generated by Django 2.2.28 on 2026-10-18 05:56
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models, transaction
+
+BATCH_SIZE = 1000
+
+
+def backfill_timelines(apps, schema_editor):
+    Follow = apps.get_model("posts", "Follow")
+    Post = apps.get_model("posts", "Post")
+    TimelineEntry = apps.get_model("posts", "TimelineEntry")
+    follows = Follow.objects.filter(
+        author__stats__followers_count__lte=settings.FANOUT_FOLLOWERS_LIMIT
+    ).values_list("user_id", "author_id")
+    for user_id, author_id in follows.iterator():
+        posts = Post.objects.filter(author_id=author_id).values_list(
+            "pk", "pub_date"
+        )
+        with transaction.atomic():
+            TimelineEntry.objects.bulk_create(
+                (
+                    TimelineEntry(
+                        user_id=user_id,
+                        post_id=pk,
+                        author_id=author_id,
+                        pub_date=pub_date,
+                    )
+                    for pk, pub_date in posts.iterator()
+                ),
+                batch_size=BATCH_SIZE,
+            )
+
+
+class Migration(migrations.Migration):
+    atomic = False
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ("posts", "0009_userstats"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="TimelineEntry",
+            fields=[
+                (
+                    "id",
+                    models.AutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("pub_date", models.DateTimeField()),
+                (
+                    "author",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="+",
+                        to=settings.AUTH_USER_MODEL,
+                    ),
+                ),
+                (
+                    "post",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="timeline_entries",
+                        to="posts.Post",
+                    ),
+                ),
+                (
+                    "user",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="timeline",
+                        to=settings.AUTH_USER_MODEL,
+                    ),
+                ),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name="timelineentry",
+            index=models.Index(
+                fields=["user", "-pub_date", "-post"],
+                name="posts_timel_user_id_98bb4a_idx",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="timelineentry",
+            index=models.Index(
+                fields=["user", "author"],
+                name="posts_timel_user_id_b036fb_idx",
+            ),
+        ),
+        migrations.AlterUniqueTogether(
+            name="timelineentry",
+            unique_together={("user", "post")},
+        ),
+        migrations.RunPython(backfill_timelines, migrations.RunPython.noop),
+    ]
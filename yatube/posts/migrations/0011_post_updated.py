@@ -0,0 +1,29 @@
+# Generated by Django 2.2.28 on 2026-10-18 06:00
+
+from django.db import migrations, models
+from django.db.models import F
+
+
+def updated_from_pub_date(apps, schema_editor):
+    Post = apps.get_model("posts", "Post")
+    Post.objects.update(updated=F("pub_date"))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("posts", "0010_timelineentry"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="post",
+            name="updated",
+            field=models.DateTimeField(
+                auto_now=True, verbose_name="date updated"
+            ),
+        ),
+        migrations.RunPython(
+            updated_from_pub_date, migrations.RunPython.noop
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 2.2.28 on 2026-10-18 06:03
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("posts", "0011_post_updated"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="post",
+            name="thumbnail",
+            field=models.CharField(blank=True, editable=False, max_length=255),
+        ),
+    ]
@@ -0,0 +1,36 @@
+# Generated by Django 2.2.28 on 2026-10-18 06:20
+
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def backfill_posts_count(apps, schema_editor):
+    Group = apps.get_model("posts", "Group")
+    Post = apps.get_model("posts", "Post")
+    posts = (
+        Post.objects.filter(group=OuterRef("pk"))
+        .order_by()
+        .values("group")
+        .annotate(total=Count("pk"))
+        .values("total")
+    )
+    Group.objects.update(posts_count=Coalesce(Subquery(posts), 0))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("posts", "0014_feed_indexes"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="group",
+            name="posts_count",
+            field=models.PositiveIntegerField(
+                default=0, editable=False, verbose_name="Записей"
+            ),
+        ),
+        migrations.RunPython(backfill_posts_count, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,24 @@
+# Generated by Django 2.2.28 on 2026-10-18 06:15
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("posts", "0015_group_posts_count"),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name="comment",
+            name="posts_comme_post_id_581ffd_idx",
+        ),
+        migrations.AddIndex(
+            model_name="comment",
+            index=models.Index(
+                fields=["post", "-created", "-id"],
+                name="posts_comme_post_id_bbe34c_idx",
+            ),
+        ),
+    ]
@@ -0,0 +1,41 @@
+# Generated by Django 2.2.28 on 2026-10-18 06:58
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("posts", "0016_comment_page_index"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="group",
+            name="updated",
+            field=models.DateTimeField(
+                auto_now=True, verbose_name="date updated"
+            ),
+        ),
+        migrations.AddField(
+            model_name="userstats",
+            name="updated",
+            field=models.DateTimeField(
+                auto_now=True, verbose_name="date updated"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="post",
+            index=models.Index(
+                fields=["author", "-updated"],
+                name="posts_post_author__085423_idx",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="post",
+            index=models.Index(
+                fields=["group", "-updated"],
+                name="posts_post_group_i_b067e3_idx",
+            ),
+        ),
+    ]
@@ -0,0 +1,29 @@
+# Generated by Django 2.2.28 on 2026-10-18 08:10
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+def backfill_fanned_out(apps, schema_editor):
+    UserStats = apps.get_model("posts", "UserStats")
+    UserStats.objects.filter(
+        followers_count__gt=settings.FANOUT_FOLLOWERS_LIMIT
+    ).update(fanned_out=False)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("posts", "0017_conditional_get_validators"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="userstats",
+            name="fanned_out",
+            field=models.BooleanField(
+                default=True, verbose_name="Раскладывается"
+            ),
+        ),
+        migrations.RunPython(backfill_fanned_out, migrations.RunPython.noop),
+    ]
@@ -1,6 +1,8 @@
 from behaviors.behaviors import Slugged
 from django.contrib.auth import get_user_model
 from django.db import models
+from django.db.models import F
+from django.utils import timezone
 
 User = get_user_model()
 
@@ -9,6 +11,11 @@ class Group(Slugged):
     title = models.CharField("Заголовок", max_length=200)
     slug = models.SlugField("Адрес страницы", blank=True, unique=True)
     description = models.TextField("Описание")
+    posts_count = models.PositiveIntegerField(
+        "Записей", default=0, editable=False
+    )
+    # Версия шапки группы: сдвигается и вместе со счётчиком записей.
+    updated = models.DateTimeField("date updated", auto_now=True)
 
     def __str__(self):
         return self.title
@@ -18,9 +25,16 @@ class Group(Slugged):
         return self.title
 
 
+class PostQuerySet(models.QuerySet):
+    def for_feed(self):
+        """Записи вместе со всем, что нужно карточке post_item.html."""
+        return self.select_related("author", "group")
+
+
 class Post(models.Model):
     text = models.TextField()
     pub_date = models.DateTimeField("date published", auto_now_add=True)
+    updated = models.DateTimeField("date updated", auto_now=True)
     author = models.ForeignKey(
         User, on_delete=models.CASCADE, related_name="posts"
     )
@@ -36,12 +50,38 @@ class Post(models.Model):
         blank=True,
         null=True,
     )
+    # URL готовой миниатюры, заполняется фоновым воркером posts.thumbnails.
+    thumbnail = models.CharField(max_length=255, blank=True, editable=False)
+    comment_count = models.PositiveIntegerField(default=0, editable=False)
+
+    objects = PostQuerySet.as_manager()
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        post = super().from_db(db, field_names, values)
+        # Группа на момент загрузки: по ней сигналы узнают о переносе
+        # записи в другую группу.
+        loaded = dict(zip(field_names, values))
+        if "group_id" in loaded:
+            post._loaded_group_id = loaded["group_id"]
+        return post
 
     def __str__(self):
         return self.text[:15]
 
     class Meta:
         ordering = ("-pub_date",)
+        # По индексу на каждую ленту: общую, автора и группы. Ленты
+        # листаются по (pub_date, id), поэтому id замыкает каждый индекс.
+        indexes = [
+            models.Index(fields=["-pub_date", "-id"]),
+            models.Index(fields=["author", "-pub_date", "-id"]),
+            models.Index(fields=["group", "-pub_date", "-id"]),
+            # Последняя версия записей автора и группы: валидаторы
+            # условных GET их страниц.
+            models.Index(fields=["author", "-updated"]),
+            models.Index(fields=["group", "-updated"]),
+        ]
 
 
 class Comment(models.Model):
@@ -64,6 +104,7 @@ class Comment(models.Model):
 
     class Meta:
         ordering = ("-created",)
+        indexes = [models.Index(fields=["post", "-created", "-id"])]
 
 
 class Follow(models.Model):
@@ -76,3 +117,56 @@ class Follow(models.Model):
 
     class Meta:
         unique_together = [["user", "author"]]
+        # Подписчики автора: рассылка постов по таймлайнам.
+        indexes = [models.Index(fields=["author", "user"])]
+
+
+class UserStats(models.Model):
+    user = models.OneToOneField(
+        User, on_delete=models.CASCADE, primary_key=True, related_name="stats"
+    )
+    followers_count = models.PositiveIntegerField("Подписчиков", default=0)
+    following_count = models.PositiveIntegerField("Подписан", default=0)
+    posts_count = models.PositiveIntegerField("Записей", default=0)
+    # Раскладываются ли записи по таймлайнам подписчиков; иначе они
+    # подмешиваются в ленту при чтении (см. posts.timeline).
+    fanned_out = models.BooleanField("Раскладывается", default=True)
+    # Версия шапки профиля: счётчиков и имени пользователя.
+    updated = models.DateTimeField("date updated", auto_now=True)
+
+    @classmethod
+    def bump(cls, user_id, **deltas):
+        """Атомарно сдвинуть счётчики пользователя на заданные величины."""
+        values = {field: F(field) + delta for field, delta in deltas.items()}
+        # update() не трогает auto_now.
+        values["updated"] = timezone.now()
+        # Не уходим в минус, если счётчик уже разошёлся с данными.
+        guards = {
+            f"{field}__gte": -delta
+            for field, delta in deltas.items()
+            if delta < 0
+        }
+        stats = cls.objects.filter(user_id=user_id, **guards)
+        if not stats.update(**values) and not guards:
+            cls.objects.get_or_create(user_id=user_id)
+            stats.update(**values)
+
+
+class TimelineEntry(models.Model):
+    user = models.ForeignKey(
+        User, on_delete=models.CASCADE, related_name="timeline"
+    )
+    post = models.ForeignKey(
+        Post, on_delete=models.CASCADE, related_name="timeline_entries"
+    )
+    author = models.ForeignKey(
+        User, on_delete=models.CASCADE, related_name="+"
+    )
+    pub_date = models.DateTimeField()
+
+    class Meta:
+        unique_together = [["user", "post"]]
+        indexes = [
+            models.Index(fields=["user", "-pub_date", "-post"]),
+            models.Index(fields=["user", "author"]),
+        ]
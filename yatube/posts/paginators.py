@@ -0,0 +1,338 @@
+import base64
+import math
+
+from django.core.paginator import Paginator
+from django.db.models import Q
+from django.utils.dateparse import parse_datetime
+from django.utils.functional import cached_property
+
+from . import search
+from .caching import cached_count
+
+
+def _pack(*parts):
+    raw = "|".join(str(part) for part in parts)
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+
+def _unpack(token, parse_key):
+    """Вернуть (key, pk, number) из токена или None, если он битый."""
+    if not token:
+        return None
+    try:
+        padded = token + "=" * (-len(token) % 4)
+        raw = base64.urlsafe_b64decode(padded.encode()).decode()
+        key, pk, number = raw.split("|")
+        key = parse_key(key)
+        pk, number = int(pk), int(number)
+    except (ValueError, UnicodeError):
+        return None
+    if key is None:
+        return None
+    return key, pk, max(number, 1)
+
+
+def encode_cursor(row, number, date_field="pub_date"):
+    return _pack(getattr(row, date_field).isoformat(), row.pk, number)
+
+
+def decode_cursor(token):
+    """Вернуть (pub_date, pk, number) из токена или None, если он битый."""
+    return _unpack(token, parse_datetime)
+
+
+def keyset(
+    queryset, cursor=None, older=True, pk_field="pk", date_field="pub_date"
+):
+    """Упорядочить queryset по (date_field, pk_field) и отсечь по курсору.
+
+    ``older=True`` идёт от новых записей к старым, начиная строго после
+    ``cursor``; ``older=False`` идёт в обратную сторону.
+    """
+    if cursor is not None:
+        date, pk = cursor
+        op = "lt" if older else "gt"
+        # Условие на одну дату задаёт диапазон по индексу, OR лишь
+        # отсекает уже показанные записи с той же датой.
+        queryset = queryset.filter(
+            Q(**{f"{date_field}__{op}e": date}),
+            Q(**{f"{date_field}__{op}": date})
+            | Q(**{f"{pk_field}__{op}": pk}),
+        )
+    sign = "-" if older else ""
+    return queryset.order_by(f"{sign}{date_field}", f"{sign}{pk_field}")
+
+
+class CursorPaginator(Paginator):
+    """Пагинатор по ключу (date_field, id), по умолчанию (pub_date, id).
+
+    Первые ``numbered_pages`` страниц доступны по ``?page=N``, глубже
+    страницы листаются только курсорами ``?after=``/``?before=``, а
+    последняя — по ``?page=last``. Ни один запрос не сдвигается OFFSET'ом
+    дальше нумерованного окна.
+
+    ``total`` — число строк для ссылки на последнюю страницу, если оно
+    уже известно (счётчики групп и авторов). Иначе оно берётся из
+    ``cached_count`` и может отставать на PAGINATOR_COUNT_TIMEOUT секунд.
+    """
+
+    date_field = "pub_date"
+
+    def __init__(
+        self,
+        object_list,
+        per_page,
+        numbered_pages=5,
+        total=None,
+        on_each_side=2,
+        **kwargs,
+    ):
+        super().__init__(
+            keyset(object_list, date_field=self.date_field),
+            per_page,
+            **kwargs,
+        )
+        self.numbered_pages = numbered_pages
+        self.total = total
+        self.on_each_side = on_each_side
+
+    @property
+    def count(self):
+        # Считаем строки только в пределах нумерованного окна плюс одну,
+        # чтобы знать, есть ли что-то за ним.
+        if "_count" not in self.__dict__:
+            self._count = self._count_window(
+                self.numbered_pages * self.per_page + 1
+            )
+        return self._count
+
+    @property
+    def page_range(self):
+        return range(1, min(self.num_pages, self.numbered_pages) + 1)
+
+    @cached_property
+    def last_page(self):
+        """Номер последней страницы или None, если число строк неизвестно."""
+        window = self.numbered_pages * self.per_page
+        if self.__dict__.get("_count", window + 1) <= window:
+            # Нумерованное окно уже насчитало все строки.
+            total = self._count
+        else:
+            total = self._total()
+        if total is None:
+            return None
+        return max(1, math.ceil(total / self.per_page))
+
+    @cached_property
+    def window(self):
+        """Навигация вокруг текущей страницы: пары (номер, GET-параметр).
+
+        У текущей страницы параметр None, пропуск обозначен парой
+        (None, None). Первая и последняя страницы плюс ``on_each_side``
+        соседей с каждой стороны: размер не зависит от числа строк.
+        """
+        page = self.current_page
+        number = page.number
+        links = {number: None}
+        reachable = min(self.num_pages, self.numbered_pages)
+        side = self.on_each_side
+        for near in range(max(1, number - side), number + side + 1):
+            if near <= reachable:
+                links.setdefault(near, f"page={near}")
+        links.setdefault(1, "page=1")
+        if page.previous_cursor:
+            links.setdefault(number - 1, f"before={page.previous_cursor}")
+        if page.next_cursor:
+            links.setdefault(number + 1, f"after={page.next_cursor}")
+        if page.has_next() and self.last_page:
+            last = self.last_page
+            if last > max(links):
+                links[last] = (
+                    f"page={last}"
+                    if last <= self.numbered_pages
+                    else "page=last"
+                )
+
+        items = []
+        for near in sorted(links):
+            if items and near > items[-1][0] + 1:
+                items.append((None, None))
+            items.append((near, links[near]))
+        return items
+
+    def validate_number(self, number):
+        return min(super().validate_number(number), self.numbered_pages)
+
+    def page(self, number):
+        number = self.validate_number(number)
+        bottom = (number - 1) * self.per_page
+        rows = self._rows(None, bottom + self.per_page)[bottom:]
+        return self._with_cursors(self._get_page(rows, number, self))
+
+    def get_cursor_page(self, query):
+        """Страница по GET-параметрам ``after``, ``before`` или ``page``."""
+        after = self._decode(query.get("after"))
+        if after is not None:
+            return self._page_after(*after)
+        before = self._decode(query.get("before"))
+        if before is not None:
+            return self._page_before(*before)
+        if query.get("page") == "last" and self.last_page:
+            return self._page_last()
+        return self.get_page(query.get("page"))
+
+    def _encode(self, row, number):
+        return encode_cursor(row, number, self.date_field)
+
+    def _decode(self, token):
+        return decode_cursor(token)
+
+    def _total(self):
+        if self.total is None:
+            return cached_count(self.object_list)
+        return self.total
+
+    def _count_window(self, limit):
+        return self.object_list[:limit].count()
+
+    def _rows(self, cursor, limit, older=True):
+        """Не больше ``limit`` записей после ``cursor`` в заданную сторону."""
+        return list(
+            keyset(
+                self.object_list, cursor, older, date_field=self.date_field
+            )[:limit]
+        )
+
+    def _page_after(self, key, pk, number):
+        cursor = None if key is None else (key, pk)
+        rows = self._rows(cursor, self.per_page + 1)
+        has_more = len(rows) > self.per_page
+        self.num_pages = number + 1 if has_more else number
+        return self._with_cursors(
+            self._get_page(rows[: self.per_page], number, self)
+        )
+
+    def _page_before(self, key, pk, number):
+        rows = self._rows((key, pk), self.per_page + 1, older=False)
+        has_more = len(rows) > self.per_page
+        rows = rows[: self.per_page][::-1]
+        number = max(number, 2) if has_more else 1
+        self.num_pages = number + 1
+        return self._with_cursors(self._get_page(rows, number, self))
+
+    def _page_last(self):
+        last = self.last_page
+        if last <= self.numbered_pages:
+            return self.page(last)
+        rows = self._rows(None, self.per_page, older=False)[::-1]
+        self.num_pages = last
+        return self._with_cursors(self._get_page(rows, last, self))
+
+    def _with_cursors(self, page):
+        self.current_page = page
+        rows = page.object_list
+        page.next_cursor = page.previous_cursor = None
+        if rows and page.has_next():
+            page.next_cursor = self._encode(rows[-1], page.number + 1)
+        if rows and page.has_previous():
+            page.previous_cursor = self._encode(rows[0], page.number - 1)
+        return page
+
+
+class TimelinePaginator(CursorPaginator):
+    """Лента подписок из материализованного таймлайна.
+
+    ``entries`` — записи таймлайна пользователя (с полями ``pub_date`` и
+    ``post_id``), по ним выбираются id постов страницы. ``pulled`` —
+    querysets постов авторов, которых не раскладывают по таймлайнам, по
+    одному на автора: так каждый читается по индексу (author, pub_date)
+    без сортировки. Они подмешиваются при чтении.
+    """
+
+    def __init__(self, object_list, per_page, entries, pulled=(), **kw):
+        super().__init__(object_list, per_page, **kw)
+        self.entries = entries
+        self.pulled = pulled
+
+    def _total(self):
+        # object_list здесь — все записи, а не лента пользователя.
+        return self.total
+
+    def _count_window(self, limit):
+        # Строки окна переиспользуются нумерованными страницами.
+        self._window = self._rows(None, limit)
+        return len(self._window)
+
+    def _rows(self, cursor, limit, older=True):
+        if cursor is None and older and "_window" in self.__dict__:
+            return self._window[:limit]
+        ids = keyset(self.entries, cursor, older, pk_field="post_id")
+        # Порядок задаёт таймлайн, строки страницы сортируются ниже.
+        rows = list(
+            self.object_list.filter(
+                pk__in=ids.values("post_id")[:limit]
+            ).order_by()
+        )
+        for posts in self.pulled:
+            rows += keyset(posts, cursor, older)[:limit]
+        unique = {post.pk: post for post in rows}.values()
+        return sorted(
+            unique, key=lambda post: (post.pub_date, post.pk), reverse=older
+        )[:limit]
+
+
+class SearchPaginator(CursorPaginator):
+    """Результаты полнотекстового поиска по убыванию релевантности.
+
+    Ключ курсора — (rank, id) из bm25 вместо (pub_date, id). ``filters``
+    передаются в ``search.ranked``.
+    """
+
+    def __init__(self, object_list, per_page, expression, filters=None, **kw):
+        super().__init__(object_list, per_page, **kw)
+        self.expression = expression
+        self.filters = filters
+
+    def _encode(self, post, number):
+        return _pack(repr(post.rank), post.pk, number)
+
+    def _decode(self, token):
+        return _unpack(token, float)
+
+    def _total(self):
+        return self.total
+
+    def _count_window(self, limit):
+        self._window = self._rows(None, limit)
+        return len(self._window)
+
+    def _rows(self, cursor, limit, older=True):
+        if cursor is None and older and "_window" in self.__dict__:
+            return self._window[:limit]
+        ranks = dict(
+            search.ranked(self.expression, limit, cursor, older, self.filters)
+        )
+        posts = self.object_list.in_bulk(list(ranks))
+        for pk, post in posts.items():
+            post.rank = ranks[pk]
+        return sorted(
+            posts.values(),
+            key=lambda post: (post.rank, post.pk),
+            reverse=not older,
+        )
+
+
+class CommentPaginator(CursorPaginator):
+    """Комментарии порциями «показать ещё».
+
+    Только вперёд по ``?after=``, без номеров страниц: первая порция
+    читается тем же запросом, что и следующие, без подсчёта строк.
+    """
+
+    date_field = "created"
+
+    def get_cursor_page(self, query):
+        after = self._decode(query.get("after"))
+        if after is None:
+            return self._page_after(None, None, 1)
+        return self._page_after(*after)
@@ -0,0 +1,94 @@
+"""Полнотекстовый поиск по записям через FTS5-индекс posts_post_fts.
+
+Индекс создаётся миграцией 0013_post_fts и обновляется триггерами.
+"""
+
+import contextlib
+import re
+
+from django.db import connection, transaction
+
+WORD = re.compile(r"\w+")
+
+
+def match_expression(text):
+    """Превратить ввод пользователя в запрос FTS5 или вернуть None.
+
+    Каждое слово берётся в кавычки, поэтому операторы FTS5 из ввода не
+    работают и не ломают запрос. Слова ищутся по префиксу: стеммера для
+    русского в SQLite нет, а так запрос «кот» находит и «кота», и «котов».
+    """
+    words = WORD.findall(text or "")
+    if not words:
+        return None
+    return " ".join(f'"{word}"*' for word in words)
+
+
+def matching(queryset, expression):
+    """Отфильтровать записи по запросу FTS5 без ранжирования."""
+    # Не pk__in=RawSQL(...): подзапрос оказывается в двойных скобках,
+    # и SQLite берёт из него только первую строку.
+    return queryset.extra(
+        where=[
+            "posts_post.id IN (SELECT rowid FROM posts_post_fts "
+            "WHERE posts_post_fts MATCH %s)"
+        ],
+        params=[expression],
+    )
+
+
+def ranked(expression, limit, cursor=None, forward=True, filters=None):
+    """До ``limit`` пар (id, rank) по возрастанию bm25, то есть от лучших.
+
+    ``cursor`` — пара (rank, id), строго после которой начинается выборка;
+    ``forward=False`` идёт от неё в сторону лучших результатов.
+    ``filters`` — равенства по колонкам posts_post, например
+    ``{"group_id": 1}``.
+    """
+    where, params = ["posts_post_fts MATCH %s"], [expression]
+    for column, value in (filters or {}).items():
+        where.append(f"posts_post.{column} = %s")
+        params.append(value)
+    ranked_sql = (
+        "SELECT posts_post.id AS id, bm25(posts_post_fts) AS rank "
+        "FROM posts_post_fts "
+        "JOIN posts_post ON posts_post.id = posts_post_fts.rowid "
+        f"WHERE {' AND '.join(where)}"
+    )
+    op, order = (">", "ASC") if forward else ("<", "DESC")
+    sql = f"SELECT id, rank FROM ({ranked_sql})"
+    if cursor is not None:
+        sql += f" WHERE rank {op} %s OR (rank = %s AND id {op} %s)"
+        params += [cursor[0], cursor[0], cursor[1]]
+    sql += f" ORDER BY rank {order}, id {order} LIMIT %s"
+    params.append(limit)
+    with connection.cursor() as db:
+        db.execute(sql, params)
+        return db.fetchall()
+
+
+@contextlib.contextmanager
+def deferred_indexing():
+    """Не индексировать записи по одной, а добавить новые в индекс разом
+    на выходе из блока.
+
+    Для массовой вставки: вызов триггера FTS5 на каждую строку в разы
+    дороже одной вставки в индекс всех строк. Блок идёт в транзакции:
+    при ошибке триггер вернётся вместе с откатом.
+    """
+    with transaction.atomic(), connection.cursor() as db:
+        db.execute(
+            "SELECT sql FROM sqlite_master "
+            "WHERE type = 'trigger' AND name = 'posts_post_fts_insert'"
+        )
+        (trigger,) = db.fetchone()
+        db.execute("SELECT coalesce(max(id), 0) FROM posts_post")
+        (last_id,) = db.fetchone()
+        db.execute("DROP TRIGGER posts_post_fts_insert")
+        yield
+        db.execute(trigger)
+        db.execute(
+            "INSERT INTO posts_post_fts (rowid, text) "
+            "SELECT id, text FROM posts_post WHERE id > %s",
+            (last_id,),
+        )
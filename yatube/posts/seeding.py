@@ -0,0 +1,359 @@
+"""Быстрое наполнение базы синтетическими данными для нагрузочных замеров.
+
+Строки вставляются большими пачками в одной транзакции и без сигналов,
+поэтому счётчики (``UserStats``, ``Group.posts_count``,
+``Post.comment_count``), таймлайны подписчиков и поисковый индекс
+заполняются здесь же. При одном и том же ``seed`` на пустой базе
+получаются одни и те же данные.
+"""
+
+import collections
+import datetime
+import io
+import itertools
+import math
+import random
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import connection, transaction
+from django.db.models import Max
+from django.utils import timezone
+from PIL import Image, ImageDraw
+
+from . import search
+from .models import (
+    Comment,
+    Follow,
+    Group,
+    Post,
+    TimelineEntry,
+    User,
+    UserStats,
+)
+
+BATCH_SIZE = 5000
+# Популярность авторов и групп убывает как 1 / ранг ** ZIPF_EXPONENT.
+ZIPF_EXPONENT = 1.1
+# Доля записей, опубликованных в группе.
+GROUP_SHARE = 0.6
+# Даты публикации равномерно покрывают этот срок до «сейчас».
+PERIOD = datetime.timedelta(days=3 * 365)
+# Комментарии появляются в течение этого срока после записи.
+COMMENT_DELAY = datetime.timedelta(days=2)
+# Число слов в тексте распределено логнормально: (mu, sigma) логарифма.
+# У записей медиана около 27 слов с длинным хвостом, у комментариев — 10.
+POST_WORDS = (3.3, 0.9)
+COMMENT_WORDS = (2.3, 0.7)
+MAX_WORDS = 1000
+CORPUS_WORDS = 100_000
+IMAGE_SIZE = (960, 640)
+IMAGE_DIR = "posts/seed"
+WORDS = (
+    "город утро дорога дом письмо окно море лес книга друг вечер поезд "
+    "снег река работа музыка кофе ветер лето история вопрос ответ день "
+    "ночь небо время сад мост улица кот собака песня фото план идея"
+).split()
+
+
+def zipf_weights(n, exponent=ZIPF_EXPONENT):
+    """Накопленные веса рангов 1..n для ``random.choices``."""
+    return list(
+        itertools.accumulate(1 / rank**exponent for rank in range(1, n + 1))
+    )
+
+
+def _next_pk(model):
+    return (model.objects.aggregate(pk=Max("pk"))["pk"] or 0) + 1
+
+
+def _batches(items):
+    items = iter(items)
+    while True:
+        batch = list(itertools.islice(items, BATCH_SIZE))
+        if not batch:
+            return
+        yield batch
+
+
+def _insert(model, objects):
+    # bulk_create сам превращает аргумент в список, а миллион объектов
+    # модели в памяти не нужен: режем поток на пачки заранее.
+    for batch in _batches(objects):
+        model.objects.bulk_create(batch)
+
+
+def _insert_rows(model, fields, rows):
+    """Вставить кортежи значений полей ``fields`` мимо ORM.
+
+    Для самых больших таблиц: bulk_create готовит каждое значение через
+    поле модели, и на миллионах строк это дольше самой вставки. Значения
+    должны быть уже в виде для базы, поля со значением по умолчанию —
+    перечислены явно.
+    """
+    columns = [model._meta.get_field(name).column for name in fields]
+    sql = (
+        f"INSERT INTO {model._meta.db_table} ({', '.join(columns)}) "
+        f"VALUES ({', '.join(['%s'] * len(columns))})"
+    )
+    with connection.cursor() as cursor:
+        for batch in _batches(rows):
+            cursor.executemany(sql, batch)
+
+
+def _follow_graph(rng, user_ids, follows_per_user):
+    """Пары (подписчик, автор): число подписок у пользователя распределено
+    по Парето, авторы выбираются по Ципфу."""
+    ranked = user_ids[:]
+    rng.shuffle(ranked)
+    weights = zipf_weights(len(ranked))
+    for user_id in user_ids:
+        # Среднее у paretovariate(1.5) равно 3.
+        wanted = min(
+            int(rng.paretovariate(1.5) * follows_per_user / 3),
+            len(user_ids) - 1,
+        )
+        authors = set()
+        for _ in range(4):
+            missing = wanted - len(authors)
+            if missing <= 0:
+                break
+            authors.update(
+                rng.choices(ranked, cum_weights=weights, k=missing * 2)
+            )
+            authors.discard(user_id)
+        yield from ((user_id, author_id) for author_id in authors)
+
+
+def _geometric(rng, mean):
+    """Целое >= 0 с геометрическим распределением и средним ``mean``."""
+    if mean <= 0:
+        return 0
+    return int(math.log(1 - rng.random()) / math.log(mean / (mean + 1)))
+
+
+def _texts(rng, words=POST_WORDS):
+    """Бесконечный поток текстов — отрезков одного случайного корпуса.
+
+    Так слово на текст стоит одного среза, а не вызова генератора.
+    """
+    corpus = rng.choices(WORDS, k=CORPUS_WORDS)
+    while True:
+        count = min(max(int(rng.lognormvariate(*words)), 1), MAX_WORDS)
+        start = rng.randrange(CORPUS_WORDS - count)
+        end = start + count
+        yield " ".join(corpus[start:end]).capitalize()
+
+
+def generate_images(count):
+    """Имена ``count`` картинок в хранилище; недостающие создаются.
+
+    Картинки лежат в ``IMAGE_DIR`` и переиспользуются между запусками.
+    """
+    names = []
+    for i in range(count):
+        rng = random.Random(i)
+        colors = [tuple(rng.choices(range(256), k=3)) for _ in range(4)]
+        name = f"{IMAGE_DIR}/{i}.jpg"
+        names.append(name)
+        if default_storage.exists(name):
+            continue
+        image = Image.new("RGB", IMAGE_SIZE, colors[0])
+        draw = ImageDraw.Draw(image)
+        width, height = IMAGE_SIZE
+        for color in colors[1:]:
+            x, y = rng.randrange(width), rng.randrange(height)
+            draw.ellipse((x - 150, y - 150, x + 150, y + 150), fill=color)
+        content = io.BytesIO()
+        image.save(content, "JPEG", quality=85)
+        default_storage.save(name, ContentFile(content.getvalue()))
+    return names
+
+
+def _fill_timelines(first_user_id):
+    """Разложить записи по таймлайнам новых подписчиков одним запросом.
+
+    Как и при подписке, от каждого автора берутся только
+    TIMELINE_BACKFILL_POSTS последних записей.
+    """
+    entry, follow = TimelineEntry._meta.db_table, Follow._meta.db_table
+    post, stats = Post._meta.db_table, UserStats._meta.db_table
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"INSERT INTO {entry} (user_id, post_id, author_id, pub_date) "
+            f"SELECT {follow}.user_id, recent.id, recent.author_id, "
+            f"recent.pub_date FROM {follow} "
+            f"JOIN (SELECT id, author_id, pub_date, ROW_NUMBER() OVER ("
+            f"PARTITION BY author_id ORDER BY pub_date DESC, id DESC"
+            f") AS position FROM {post}) AS recent "
+            f"ON recent.author_id = {follow}.author_id "
+            f"JOIN {stats} ON {stats}.user_id = {follow}.author_id "
+            f"WHERE {follow}.user_id >= %s "
+            f"AND {stats}.fanned_out AND recent.position <= %s",
+            [first_user_id, settings.TIMELINE_BACKFILL_POSTS],
+        )
+
+
+def seed(
+    posts,
+    users=None,
+    groups=None,
+    follows_per_user=10,
+    comments_per_post=2,
+    images=(),
+    image_share=0.1,
+    seed=0,
+):
+    """Добавить в базу ``posts`` записей вместе с авторами, подписками и
+    комментариями.
+
+    По умолчанию на 20 записей приходится один пользователь, а на 20 000
+    записей — одна группа. Число комментариев к записи распределено
+    геометрически со средним ``comments_per_post``. Доля ``image_share``
+    записей получает картинку из ``images`` — имён файлов в хранилище.
+    Возвращает число созданных строк по моделям.
+    """
+    rng = random.Random(seed)
+    users = users or max(posts // 20, 10)
+    groups = groups or max(posts // 20000, 5)
+    now = timezone.now()
+
+    with transaction.atomic():
+        first_user_id = _next_pk(User)
+        user_ids = list(range(first_user_id, first_user_id + users))
+        first_group_id = _next_pk(Group)
+        group_ids = list(range(first_group_id, first_group_id + groups))
+        first_post_id = _next_pk(Post)
+
+        # Плодовитость авторов не связана с их популярностью у читателей.
+        writers = user_ids[:]
+        rng.shuffle(writers)
+        writer_weights = zipf_weights(users)
+        post_authors = rng.choices(
+            writers, cum_weights=writer_weights, k=posts
+        )
+        group_weights = zipf_weights(groups)
+        post_groups = [
+            (
+                rng.choices(group_ids, cum_weights=group_weights)[0]
+                if rng.random() < GROUP_SHARE
+                else None
+            )
+            for _ in range(posts)
+        ]
+        comment_counts = [
+            _geometric(rng, comments_per_post) for _ in range(posts)
+        ]
+        follows = list(_follow_graph(rng, user_ids, follows_per_user))
+        post_texts = _texts(rng)
+        comment_texts = _texts(rng, COMMENT_WORDS)
+
+        posts_count = collections.Counter(post_authors)
+        group_posts = collections.Counter(post_groups)
+        followers = collections.Counter(author for _, author in follows)
+        following = collections.Counter(user for user, _ in follows)
+
+        _insert(
+            User,
+            (
+                User(pk=pk, username=f"user{pk}", password="!")
+                for pk in user_ids
+            ),
+        )
+        _insert(
+            UserStats,
+            (
+                UserStats(
+                    user_id=pk,
+                    posts_count=posts_count[pk],
+                    followers_count=followers[pk],
+                    following_count=following[pk],
+                    fanned_out=(
+                        followers[pk] <= settings.FANOUT_FOLLOWERS_LIMIT
+                    ),
+                )
+                for pk in user_ids
+            ),
+        )
+        _insert(
+            Group,
+            (
+                Group(
+                    pk=pk,
+                    title=f"Группа {pk}",
+                    slug=f"group{pk}",
+                    description=next(post_texts),
+                    posts_count=group_posts[pk],
+                )
+                for pk in group_ids
+            ),
+        )
+        start = now - PERIOD
+        pub_dates = [
+            start + PERIOD * ((i + rng.random()) / posts) for i in range(posts)
+        ]
+        to_db = connection.ops.adapt_datetimefield_value
+        with search.deferred_indexing():
+            _insert_rows(
+                Post,
+                (
+                    "id",
+                    "text",
+                    "author",
+                    "group",
+                    "image",
+                    "thumbnail",
+                    "comment_count",
+                    "pub_date",
+                    "updated",
+                ),
+                (
+                    (
+                        first_post_id + i,
+                        next(post_texts),
+                        author_id,
+                        group_id,
+                        (
+                            rng.choice(images)
+                            if images and rng.random() < image_share
+                            else None
+                        ),
+                        "",
+                        comment_counts[i],
+                        to_db(pub_dates[i]),
+                        to_db(now),
+                    )
+                    for i, (author_id, group_id) in enumerate(
+                        zip(post_authors, post_groups)
+                    )
+                ),
+            )
+        _insert_rows(
+            Comment,
+            ("post", "author", "text", "created"),
+            (
+                (
+                    first_post_id + i,
+                    author_id,
+                    next(comment_texts),
+                    to_db(
+                        min(pub_dates[i] + COMMENT_DELAY * rng.random(), now)
+                    ),
+                )
+                for i, count in enumerate(comment_counts)
+                for author_id in rng.choices(
+                    writers, cum_weights=writer_weights, k=count
+                )
+            ),
+        )
+        _insert_rows(Follow, ("user", "author"), follows)
+        _fill_timelines(first_user_id)
+
+    return {
+        "users": users,
+        "groups": groups,
+        "posts": posts,
+        "comments": sum(comment_counts),
+        "follows": len(follows),
+    }
@@ -0,0 +1,190 @@
+import logging
+import threading
+import urllib.request
+
+from django.conf import settings
+from django.db.models import F
+from django.db.models.signals import post_delete, post_init, post_save
+from django.dispatch import receiver
+from django.utils import timezone
+
+from . import caching, timeline
+from .models import Comment, Follow, Group, Post, User, UserStats
+
+logger = logging.getLogger(__name__)
+
+# Теги, сброс которых ещё не отправлен прокси. Пока набор не пуст,
+# отправка уже стоит в очереди и заберёт и добавленные теги.
+_proxy_tags = set()
+_proxy_lock = threading.Lock()
+
+
+@receiver(post_save, sender=Comment)
+def comment_created(sender, instance, created, raw=False, **kwargs):
+    if created and not raw and instance.post_id is not None:
+        # update() не трогает auto_now, а комментарии видны на странице
+        # записи, поэтому её версия сдвигается явно.
+        Post.objects.filter(pk=instance.post_id).update(
+            comment_count=F("comment_count") + 1, updated=timezone.now()
+        )
+        caching.purge(
+            caching.post_tag(instance.post_id),
+            caching.comments_tag(instance.post_id),
+        )
+
+
+@receiver(post_delete, sender=Comment)
+def comment_deleted(sender, instance, **kwargs):
+    # Срабатывает и при каскадном удалении комментариев вместе с автором.
+    if instance.post_id is not None:
+        Post.objects.filter(pk=instance.post_id, comment_count__gt=0).update(
+            comment_count=F("comment_count") - 1, updated=timezone.now()
+        )
+        caching.purge(
+            caching.post_tag(instance.post_id),
+            caching.comments_tag(instance.post_id),
+        )
+
+
+@receiver(post_init, sender=User)
+def user_loaded(sender, instance, **kwargs):
+    # Отложенное поле не читаем: это был бы запрос на каждый объект.
+    instance._loaded_username = instance.__dict__.get("username")
+
+
+def _author_renamed(author_id):
+    """Имя автора видно и на карточках его записей в лентах групп."""
+    Group.objects.filter(posts__author_id=author_id).update(
+        updated=timezone.now()
+    )
+    caching.purge(caching.author_name_tag(author_id))
+
+
+@receiver(post_save, sender=User)
+def user_saved(
+    sender, instance, created, raw=False, update_fields=None, **kwargs
+):
+    if created and not raw:
+        UserStats.objects.get_or_create(user=instance)
+    elif update_fields != {"last_login"}:
+        # Имя пользователя видно в шапке профиля и его записей.
+        UserStats.objects.filter(user_id=instance.pk).update(
+            updated=timezone.now()
+        )
+        caching.purge(caching.author_tag(instance.pk))
+        # Имя видно и на карточках записей в лентах. Без загруженного
+        # значения считаем, что оно могло смениться.
+        if not raw and instance._loaded_username != instance.username:
+            _author_renamed(instance.pk)
+    instance._loaded_username = instance.username
+
+
+def _count_group_posts(group_id, delta):
+    if group_id is None:
+        return
+    groups = Group.objects.filter(pk=group_id)
+    if delta < 0:
+        groups = groups.filter(posts_count__gte=-delta)
+    groups.update(posts_count=F("posts_count") + delta, updated=timezone.now())
+    caching.purge(caching.group_feed_tag(group_id))
+
+
+@receiver(post_save, sender=Post)
+def post_saved(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        UserStats.bump(instance.author_id, posts_count=1)
+        _count_group_posts(instance.group_id, 1)
+        timeline.fan_out(instance)
+        caching.purge(caching.FEED_TAG, caching.author_tag(instance.author_id))
+    else:
+        # Без загруженного значения считаем, что группа не менялась.
+        old_group_id = getattr(instance, "_loaded_group_id", instance.group_id)
+        if not raw and old_group_id != instance.group_id:
+            _count_group_posts(old_group_id, -1)
+            _count_group_posts(instance.group_id, 1)
+        caching.purge(caching.post_tag(instance.pk))
+    instance._loaded_group_id = instance.group_id
+
+
+@receiver(post_delete, sender=Post)
+def post_deleted(sender, instance, **kwargs):
+    UserStats.bump(instance.author_id, posts_count=-1)
+    _count_group_posts(instance.group_id, -1)
+    caching.purge(
+        caching.FEED_TAG,
+        caching.post_tag(instance.pk),
+        caching.author_tag(instance.author_id),
+    )
+
+
+@receiver(post_save, sender=Follow)
+def follow_created(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        UserStats.bump(instance.author_id, followers_count=1)
+        UserStats.bump(instance.user_id, following_count=1)
+        timeline.update_fan_out(instance.author_id)
+        timeline.backfill(instance.user_id, instance.author_id)
+        caching.purge(
+            caching.author_tag(instance.author_id),
+            caching.author_tag(instance.user_id),
+        )
+
+
+@receiver(post_delete, sender=Follow)
+def follow_deleted(sender, instance, **kwargs):
+    UserStats.bump(instance.author_id, followers_count=-1)
+    UserStats.bump(instance.user_id, following_count=-1)
+    timeline.trim(instance.user_id, instance.author_id)
+    timeline.update_fan_out(instance.author_id)
+    caching.purge(
+        caching.author_tag(instance.author_id),
+        caching.author_tag(instance.user_id),
+    )
+
+
+@receiver(post_save, sender=Group)
+@receiver(post_delete, sender=Group)
+def group_changed(sender, instance, **kwargs):
+    caching.purge(caching.group_tag(instance.pk))
+
+
+@receiver(caching.tags_purged)
+def purge_proxies(sender, tags, **kwargs):
+    """Передать сброс тегов обратным прокси из SURROGATE_PURGE_URLS.
+
+    Запросы уходят из фоновых потоков кеша, чтобы медленный прокси не
+    задерживал запись, а сбросы, накопившиеся до отправки, уходят одним
+    запросом. Без FEED_REFRESH_WORKERS — сразу, в потоке запроса.
+    """
+    if not settings.SURROGATE_PURGE_URLS:
+        return
+    if not settings.FEED_REFRESH_WORKERS:
+        _send_purge(tags)
+        return
+    with _proxy_lock:
+        queued = bool(_proxy_tags)
+        _proxy_tags.update(tags)
+    if not queued:
+        caching.get_executor().submit(_send_queued_purge)
+
+
+def _send_queued_purge():
+    with _proxy_lock:
+        tags = sorted(_proxy_tags)
+        _proxy_tags.clear()
+    _send_purge(tags)
+
+
+def _send_purge(tags):
+    for url in settings.SURROGATE_PURGE_URLS:
+        request = urllib.request.Request(
+            url, method="PURGE", headers={"Surrogate-Key": " ".join(tags)}
+        )
+        try:
+            urllib.request.urlopen(
+                request, timeout=settings.SURROGATE_PURGE_TIMEOUT
+            ).close()
+        except OSError:
+            # Без сброса прокси отдаёт старую копию, но запись уже
+            # сохранена: отменять её не из-за чего.
+            logger.warning("Прокси %s не принял сброс", url, exc_info=True)
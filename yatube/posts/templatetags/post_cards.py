@@ -0,0 +1,50 @@
+from django import template
+from django.core.cache import cache
+from django.template.loader import render_to_string
+from django.urls import reverse
+from django.utils.html import format_html
+from django.utils.safestring import mark_safe
+
+from ..caching import CARD_TIMEOUT, card_key
+
+register = template.Library()
+
+EDIT_MARKER = "<!-- post-edit -->"
+
+
+def edit_button(post):
+    return format_html(
+        '<a class="btn btn-sm btn-info ml-2" href="{}" role="button">'
+        "Редактировать</a>",
+        reverse("post_edit", args=(post.author.username, post.pk)),
+    )
+
+
+@register.simple_tag(takes_context=True)
+def post_cards(context, posts):
+    """Карточки постов из кеша фрагментов, недостающие дорисовываются.
+
+    В кеше лежит HTML, одинаковый для всех читателей; кнопка
+    редактирования подставляется автору уже после чтения из кеша.
+    """
+    posts = {card_key(post): post for post in posts}
+    cards = cache.get_many(list(posts))
+    missing = {
+        key: render_to_string("posts/post_item.html", {"post": post})
+        for key, post in posts.items()
+        if key not in cards
+    }
+    if missing:
+        cache.set_many(missing, timeout=CARD_TIMEOUT)
+        cards.update(missing)
+
+    user = context.get("user")
+    html = []
+    for key, post in posts.items():
+        is_author = user is not None and user.pk == post.author_id
+        html.append(
+            cards[key].replace(
+                EDIT_MARKER, edit_button(post) if is_author else ""
+            )
+        )
+    return mark_safe("".join(html))
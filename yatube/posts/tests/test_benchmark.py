@@ -0,0 +1,183 @@
+import io
+import random
+import shutil
+import tempfile
+
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db.models import Count, F, Sum
+from django.test import TestCase, override_settings
+
+from .. import benchmark, search, seeding
+from ..models import (
+    Comment,
+    Follow,
+    Group,
+    Post,
+    TimelineEntry,
+    User,
+    UserStats,
+)
+
+
+@override_settings(FANOUT_FOLLOWERS_LIMIT=5, TIMELINE_BACKFILL_POSTS=8)
+class SeedTest(TestCase):
+    def test_counters_match_rows(self):
+        seeding.seed(300, users=30, groups=3, seed=1)
+        self.assertEqual(Post.objects.count(), 300)
+        self.assertEqual(
+            UserStats.objects.aggregate(total=Sum("posts_count"))["total"],
+            300,
+        )
+        for group in Group.objects.annotate(rows=Count("posts")):
+            self.assertEqual(group.posts_count, group.rows)
+        for stats in UserStats.objects.annotate(
+            followers=Count("user__following", distinct=True),
+            following=Count("user__follower", distinct=True),
+        ):
+            self.assertEqual(stats.followers_count, stats.followers)
+            self.assertEqual(stats.following_count, stats.following)
+        # Таймлайны есть только у подписчиков авторов, чьи посты
+        # раскладываются при публикации, и в них только последние
+        # записи каждого автора.
+        follows = Follow.objects.filter(author__stats__followers_count__lte=5)
+        for follow in follows:
+            latest = Post.objects.filter(author_id=follow.author_id).order_by(
+                "-pub_date", "-id"
+            )[:8]
+            entries = TimelineEntry.objects.filter(
+                user_id=follow.user_id, author_id=follow.author_id
+            )
+            self.assertEqual(
+                set(entries.values_list("post_id", flat=True)),
+                {post.pk for post in latest},
+            )
+        self.assertEqual(
+            TimelineEntry.objects.count(),
+            sum(
+                min(Post.objects.filter(author_id=author_id).count(), 8)
+                for author_id in follows.values_list("author_id", flat=True)
+            ),
+        )
+        self.assertTrue(
+            UserStats.objects.filter(followers_count__lte=5, posts_count__gt=8)
+        )
+        self.assertTrue(
+            Follow.objects.filter(author__stats__followers_count__gt=5)
+        )
+
+    def test_comments(self):
+        seeding.seed(200, comments_per_post=3, seed=3)
+        self.assertEqual(
+            Post.objects.aggregate(total=Sum("comment_count"))["total"],
+            Comment.objects.count(),
+        )
+        self.assertFalse(
+            Post.objects.annotate(rows=Count("comments")).exclude(
+                comment_count=F("rows")
+            )
+        )
+        self.assertFalse(
+            Comment.objects.filter(created__lt=F("post__pub_date"))
+        )
+
+    def test_posts_are_searchable(self):
+        seeding.seed(50, seed=4)
+        word = seeding.WORDS[0]
+        self.assertEqual(
+            set(
+                search.matching(
+                    Post.objects.all(), search.match_expression(word)
+                )
+            ),
+            {post for post in Post.objects.all() if word in post.text.lower()},
+        )
+        # Триггер индекса вернулся на место.
+        post = Post.objects.create(
+            text="Уникальное", author=User.objects.first()
+        )
+        self.assertEqual(
+            list(
+                search.matching(
+                    Post.objects.all(), search.match_expression("уникальное")
+                )
+            ),
+            [post],
+        )
+
+    def test_command_attaches_images(self):
+        media = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media, ignore_errors=True)
+        with override_settings(MEDIA_ROOT=media):
+            call_command(
+                "seed_yatube",
+                posts=20,
+                images=2,
+                image_share=1,
+                stdout=io.StringIO(),
+            )
+        self.assertEqual(Post.objects.count(), 20)
+        self.assertEqual(
+            set(Post.objects.values_list("image", flat=True)),
+            {f"{seeding.IMAGE_DIR}/0.jpg", f"{seeding.IMAGE_DIR}/1.jpg"},
+        )
+
+    def test_same_seed_gives_same_data(self):
+        def snapshot():
+            return list(
+                Post.objects.order_by("pk").values_list(
+                    "text", "author__username", "group__slug", "pub_date"
+                )
+            )
+
+        seeding.seed(50, seed=7)
+        first = snapshot()
+        User.objects.all().delete()
+        Group.objects.all().delete()
+        seeding.seed(50, seed=7)
+        # Даты отсчитываются от момента запуска.
+        self.assertEqual(
+            [row[:3] for row in snapshot()], [row[:3] for row in first]
+        )
+
+
+class BenchmarkTest(TestCase):
+    def test_run_measures_every_view(self):
+        cache.clear()
+        seeding.seed(100, seed=2)
+        scenario = benchmark.Scenario(random.Random(0))
+        results = benchmark.run(scenario, requests=3, warmup=1)
+        self.assertEqual(set(results), set(benchmark.VIEWS))
+        for stats in results.values():
+            self.assertEqual(stats["requests"], 3)
+            self.assertLessEqual(stats["p50_ms"], stats["p99_ms"])
+        self.assertGreater(results["new_post"]["queries_max"], 0)
+
+    def test_anonymous_throughput(self):
+        cache.clear()
+        seeding.seed(100, seed=2)
+        scenario = benchmark.Scenario(random.Random(0))
+        results = benchmark.anonymous_throughput(scenario, requests=8)
+        self.assertEqual(
+            set(results), {"full_stack_rps", "fast_path_rps", "speedup"}
+        )
+        self.assertGreater(results["fast_path_rps"], 0)
+
+    def test_compare(self):
+        base = {"10000": {"index": {"p50_ms": 10.0, "p99_ms": 50.0}}}
+        base["10000"]["index"]["queries_max"] = 3
+        current = {
+            "10000": {
+                "index": {"p50_ms": 10.5, "p99_ms": 70.0, "queries_max": 4}
+            },
+            "100000": {
+                "index": {"p50_ms": 99.0, "p99_ms": 99.0, "queries_max": 9}
+            },
+        }
+        self.assertEqual(
+            benchmark.compare(current, base, tolerance=0.2),
+            [
+                "10000 index p99_ms: 50.0 -> 70.0",
+                "10000 index queries_max: 3 -> 4",
+            ],
+        )
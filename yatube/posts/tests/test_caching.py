@@ -0,0 +1,439 @@
+import gzip
+import io
+import time
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.contrib.auth.models import AnonymousUser
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import OperationalError, connection
+from django.test import (
+    Client,
+    RequestFactory,
+    SimpleTestCase,
+    TestCase,
+    override_settings,
+)
+
+from .. import caching
+from ..local_cache import LocalCache
+from ..models import Comment, Group, Post
+from ..templatetags import post_cards
+
+User = get_user_model()
+
+
+@override_settings(FEED_REFRESH_WORKERS=0)
+class StampedeTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        caching._stats.clear()
+        self.author = User.objects.create(username="Pasha")
+        Post.objects.create(text="Первая запись", author=self.author)
+
+    def test_outdated_page_is_recomputed_once(self):
+        client = Client()
+        client.get("/")
+        Post.objects.create(text="Вторая запись", author=self.author)
+
+        # Пока другой запрос пересчитывает страницу, отдаётся прежняя.
+        with mock.patch.object(caching, "_lock", return_value=False):
+            with self.assertNumQueries(0):
+                response = client.get("/")
+        self.assertNotContains(response, "Вторая запись")
+
+        response = client.get("/")
+        self.assertContains(response, "Вторая запись")
+        # Блокировка снята: следующий пересчёт снова возможен.
+        request = RequestFactory().get("/")
+        request.user = AnonymousUser()
+        key = caching._page_key("index_page", request)
+        self.assertTrue(caching._lock(key))
+        caching._unlock(key)
+
+        client.get("/")
+        self.assertEqual(
+            caching.cache_stats()["index_page"],
+            {"hit": 1, "miss": 1, "stale": 1, "recompute": 1},
+        )
+
+    def test_early_recompute(self):
+        compute = mock.Mock(return_value=1)
+        self.assertEqual(caching.early_cached("test", "k", compute, 60), 1)
+        self.assertEqual(caching.early_cached("test", "k", compute, 60), 1)
+        self.assertEqual(compute.call_count, 1)
+
+        # Считалось 10 секунд, до срока секунда: пора пересчитывать.
+        cache.set("k", (5, 10.0, time.time() + 1), timeout=60)
+        with mock.patch.object(caching.random, "random", return_value=0.999):
+            with mock.patch.object(caching, "_lock", return_value=False):
+                self.assertEqual(
+                    caching.early_cached("test", "k", compute, 60), 5
+                )
+            self.assertEqual(caching.early_cached("test", "k", compute, 60), 1)
+        self.assertEqual(compute.call_count, 2)
+        self.assertEqual(
+            caching.cache_stats()["test"],
+            {"hit": 1, "miss": 1, "stale": 1, "recompute": 1},
+        )
+
+    def test_cache_stats_command(self):
+        Client().get("/")
+        output = io.StringIO()
+        call_command("cache_stats", stdout=output)
+        self.assertIn("index_page", output.getvalue())
+
+
+class FakeExecutor:
+    def __init__(self):
+        self.jobs = []
+
+    def submit(self, *job):
+        self.jobs.append(job)
+
+    def run(self):
+        # Фоновый пересчёт закрывает соединение своего потока, а в тесте
+        # поток один.
+        with mock.patch.object(caching, "connection"):
+            for function, *args in self.jobs:
+                function(*args)
+        self.jobs.clear()
+
+
+@override_settings(FEED_REFRESH_WORKERS=1)
+class StaleTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.author = User.objects.create(username="Pasha")
+        Post.objects.create(text="Первая запись", author=self.author)
+        self.executor = FakeExecutor()
+        patcher = mock.patch.object(
+            caching, "get_executor", return_value=self.executor
+        )
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_stale_while_revalidate(self):
+        client = Client()
+        client.get("/")
+        Post.objects.create(text="Вторая запись", author=self.author)
+
+        response = client.get("/")
+        self.assertNotContains(response, "Вторая запись")
+        self.assertEqual(response["X-Cache"], "STALE")
+        self.assertEqual(len(self.executor.jobs), 1)
+        # Пока идёт фоновый пересчёт, второй он не запускается.
+        self.assertEqual(client.get("/")["X-Cache"], "STALE")
+        self.assertEqual(len(self.executor.jobs), 1)
+
+        self.executor.run()
+        response = client.get("/")
+        self.assertContains(response, "Вторая запись")
+        self.assertFalse(response.has_header("X-Cache"))
+
+    def index_key(self):
+        request = RequestFactory().get("/")
+        request.user = AnonymousUser()
+        return caching._page_key("index_page", request)
+
+    def test_window_starts_when_page_is_found_stale(self):
+        client = Client()
+        client.get("/")
+        key = self.index_key()
+        versions, response, stored = cache.get(key)
+        # Отрисована час назад и до сих пор была свежей.
+        cache.set(key, (versions, response, stored - 3600), timeout=None)
+        Post.objects.create(text="Вторая запись", author=self.author)
+
+        self.assertEqual(client.get("/")["X-Cache"], "STALE")
+        self.assertEqual(len(self.executor.jobs), 1)
+
+    def test_page_stale_for_too_long_is_recomputed_in_request(self):
+        client = Client()
+        client.get("/")
+        Post.objects.create(text="Вторая запись", author=self.author)
+        self.assertEqual(client.get("/")["X-Cache"], "STALE")
+        # Фоновый пересчёт не удался, а устаревшей страницу застали
+        # час назад.
+        self.executor.jobs.clear()
+        key = self.index_key()
+        caching._unlock(key)
+        stored = cache.get(key)[2]
+        cache.set(f"stale:{key}:{stored}", time.time() - 3600)
+
+        self.assertContains(client.get("/"), "Вторая запись")
+        self.assertEqual(self.executor.jobs, [])
+
+    def test_authenticated_user_sees_fresh_page(self):
+        self.client.force_login(self.author)
+        self.client.get("/")
+        Post.objects.create(text="Вторая запись", author=self.author)
+        self.assertContains(self.client.get("/"), "Вторая запись")
+        self.assertEqual(self.executor.jobs, [])
+
+    def test_stale_if_error(self):
+        self.client.force_login(self.author)
+        self.client.get("/")
+        Post.objects.create(text="Вторая запись", author=self.author)
+        locked = OperationalError("database is locked")
+        with mock.patch("posts.views.CursorPaginator", side_effect=locked):
+            with self.assertLogs("posts.caching", "WARNING"):
+                response = self.client.get("/")
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(response["X-Cache"], "STALE")
+            self.assertNotContains(response, "Вторая запись")
+
+            with override_settings(FEED_STALE_IF_ERROR=-1), self.assertLogs(
+                "django.request", "ERROR"
+            ), self.assertRaises(OperationalError):
+                self.client.get("/")
+
+    @override_settings(FEED_REFRESH_WORKERS=0)
+    def test_stale_if_error_when_database_is_down(self):
+        """Недоступна вся база, включая валидаторы условного GET."""
+        group = Group.objects.create(title="Коты", slug="cats")
+        Post.objects.create(text="Котик", author=self.author, group=group)
+        urls = ("/", "/group/cats/", "/Pasha/")
+        for url in urls:
+            self.client.get(url)
+        Post.objects.create(
+            text="Вторая запись", author=self.author, group=group
+        )
+
+        def locked(execute, sql, params, many, context):
+            raise OperationalError("database is locked")
+
+        with connection.execute_wrapper(locked):
+            for url in urls:
+                with self.subTest(url=url), self.assertLogs(
+                    "posts.caching", "WARNING"
+                ):
+                    response = self.client.get(url)
+                    self.assertEqual(response.status_code, 200)
+                    self.assertEqual(response["X-Cache"], "STALE")
+                    self.assertNotContains(response, "Вторая запись")
+
+
+@override_settings(FEED_REFRESH_WORKERS=0)
+class TagTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.author = User.objects.create(username="Pasha")
+        self.reader = User.objects.create(username="Masha")
+        self.group = Group.objects.create(title="Коты", slug="cats")
+        self.post = Post.objects.create(
+            text="Первая запись", author=self.author, group=self.group
+        )
+        self.other = Post.objects.create(text="Вторая", author=self.reader)
+
+    def test_surrogate_key_header(self):
+        post, other = f"post:{self.post.pk}", f"post:{self.other.pk}"
+        group, author = f"group:{self.group.pk}", f"author:{self.author.pk}"
+        name, other_name = f"{author}:name", f"author:{self.reader.pk}:name"
+        expected = {
+            "/": {"feed", post, other, group, name, other_name},
+            "/group/cats/": {post, group, f"{group}:feed", name},
+            "/Pasha/": {post, group, author, name},
+            f"/Pasha/{self.post.pk}/": {
+                post,
+                f"comments:{self.post.pk}",
+                author,
+            },
+        }
+        for url, tags in expected.items():
+            with self.subTest(url=url):
+                response = self.client.get(url)
+                self.assertEqual(set(response["Surrogate-Key"].split()), tags)
+                # Закешированная страница отдаёт те же теги.
+                self.assertEqual(
+                    set(self.client.get(url)["Surrogate-Key"].split()), tags
+                )
+
+    def test_comment_purges_only_its_post(self):
+        url = f"/Pasha/{self.post.pk}/"
+        other_url = f"/Masha/{self.other.pk}/"
+        self.client.get(url)
+        self.client.get(other_url)
+        Comment.objects.create(post=self.other, author=self.author, text="Да")
+        # Остаётся только сверка версии записи для условного GET.
+        with self.assertNumQueries(1):
+            self.client.get(url)
+        self.assertContains(self.client.get(other_url), "Да")
+
+    def test_purge_during_render_is_not_cached_as_current(self):
+        render_to_string = post_cards.render_to_string
+
+        def render_and_publish(*args, **kwargs):
+            # Запись публикуется, когда лента уже прочитана из базы.
+            if not Post.objects.filter(text="Пока рисовалось").exists():
+                Post.objects.create(text="Пока рисовалось", author=self.author)
+            return render_to_string(*args, **kwargs)
+
+        with mock.patch.object(
+            post_cards, "render_to_string", side_effect=render_and_publish
+        ):
+            self.assertNotContains(self.client.get("/"), "Пока рисовалось")
+        self.assertContains(self.client.get("/"), "Пока рисовалось")
+
+    def test_rename_updates_feeds(self):
+        etag = self.client.get("/group/cats/")["ETag"]
+        self.client.get("/")
+        self.author.username = "Pavel"
+        self.author.save()
+        for url in ("/", "/group/cats/"):
+            with self.subTest(url=url):
+                response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+                self.assertContains(response, "@Pavel")
+                self.assertNotContains(response, "@Pasha")
+
+    def test_profile_edit_keeps_feeds(self):
+        self.author.first_name = "Павел"
+        with mock.patch.object(caching, "purge") as purge:
+            self.author.save()
+        purge.assert_called_once_with(f"author:{self.author.pk}")
+
+    def test_purge_is_announced_after_commit(self):
+        with mock.patch.object(
+            caching.transaction, "on_commit"
+        ) as on_commit, mock.patch.object(caching.tags_purged, "send") as send:
+            caching.purge("post:1", "feed")
+            send.assert_not_called()
+            on_commit.call_args[0][0]()
+        send.assert_called_once_with(sender=None, tags=("post:1", "feed"))
+
+    @override_settings(SURROGATE_PURGE_URLS=["http://proxy/purge"])
+    def test_purge_is_passed_to_proxies(self):
+        with mock.patch("urllib.request.urlopen") as urlopen:
+            caching.tags_purged.send(sender=None, tags=("post:1", "feed"))
+        request = urlopen.call_args[0][0]
+        self.assertEqual(request.get_method(), "PURGE")
+        self.assertEqual(request.full_url, "http://proxy/purge")
+        self.assertEqual(request.get_header("Surrogate-key"), "post:1 feed")
+
+        with mock.patch(
+            "urllib.request.urlopen", side_effect=OSError
+        ), self.assertLogs("posts.signals", "WARNING"):
+            caching.tags_purged.send(sender=None, tags=("feed",))
+
+    @override_settings(
+        SURROGATE_PURGE_URLS=["http://proxy/purge"], FEED_REFRESH_WORKERS=1
+    )
+    def test_proxy_purges_are_sent_in_background_together(self):
+        executor = FakeExecutor()
+        with mock.patch.object(
+            caching, "get_executor", return_value=executor
+        ), mock.patch("urllib.request.urlopen") as urlopen:
+            caching.tags_purged.send(sender=None, tags=("post:1",))
+            caching.tags_purged.send(sender=None, tags=("feed", "post:1"))
+            urlopen.assert_not_called()
+            self.assertEqual(len(executor.jobs), 1)
+            executor.run()
+        request = urlopen.call_args[0][0]
+        self.assertEqual(urlopen.call_count, 1)
+        self.assertEqual(request.get_header("Surrogate-key"), "feed post:1")
+
+    def test_login_keeps_user_pages(self):
+        with mock.patch.object(caching, "purge") as purge:
+            self.client.force_login(self.author)
+        purge.assert_not_called()
+
+
+class LocalCacheTest(SimpleTestCase):
+    def test_least_recently_read_are_evicted(self):
+        local = LocalCache(max_size=10, timeout=60)
+        local.set("a", 1, 4)
+        local.set("b", 2, 4)
+        local.get("a")
+        local.set("c", 3, 4)
+        self.assertEqual([local.get(key) for key in "abc"], [1, None, 3])
+        # Больше всего кеша значение не кладётся и вытесняет прежнее.
+        local.set("a", 4, 11)
+        self.assertEqual([local.get(key) for key in "ac"], [None, 3])
+        self.assertEqual(local._size, 4)
+
+    def test_timeout(self):
+        local = LocalCache(max_size=10, timeout=5)
+        with mock.patch("time.monotonic", return_value=100):
+            local.set("a", 1, 1)
+        with mock.patch("time.monotonic", return_value=104):
+            self.assertEqual(local.get("a"), 1)
+        with mock.patch("time.monotonic", return_value=105):
+            self.assertIsNone(local.get("a"))
+        self.assertFalse(local._entries)
+
+
+@override_settings(FEED_REFRESH_WORKERS=0)
+class LocalPageTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        caching.local_cache.clear()
+        self.author = User.objects.create(username="Pasha")
+        self.post = Post.objects.create(
+            text="Первая запись", author=self.author
+        )
+
+    def test_page_is_read_from_process_memory(self):
+        self.client.get("/")
+        with mock.patch.object(caching.cache, "get") as get:
+            response = self.client.get("/")
+        get.assert_not_called()
+        self.assertContains(response, "Первая запись")
+
+        Post.objects.create(text="Вторая запись", author=self.author)
+        self.assertContains(self.client.get("/"), "Вторая запись")
+
+    def test_cleared_shared_cache_is_not_outlived(self):
+        # Страница сохранится с тегами, у которых ещё нет версий.
+        cache.clear()
+        self.client.get("/")
+        Post.objects.filter(pk=self.post.pk).update(text="Другой текст")
+        cache.clear()
+        self.assertContains(self.client.get("/"), "Другой текст")
+
+    def test_requests_get_own_copies(self):
+        first = self.client.get("/")
+        first["X-Test"] = "1"
+        first.set_cookie("test", "1")
+        second = self.client.get("/")
+        third = self.client.get("/")
+        self.assertNotIn("X-Test", second)
+        self.assertNotIn("test", second.cookies)
+        self.assertIsNot(second, third)
+        self.assertEqual(second.content, third.content)
+
+
+@override_settings(FEED_REFRESH_WORKERS=0)
+class PageCompressionTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        caching.local_cache.clear()
+        author = User.objects.create(username="Pasha")
+        Post.objects.create(text="Первая запись", author=author)
+
+    def test_pages_are_stored_and_served_compressed(self):
+        plain = self.client.get("/")
+        self.assertNotIn("Content-Encoding", plain)
+        self.assertIn("Accept-Encoding", plain["Vary"])
+
+        for source in ("shared", "local"):
+            with self.subTest(source=source):
+                if source == "shared":
+                    caching.local_cache.clear()
+                with mock.patch.object(caching, "compress_string") as compress:
+                    response = self.client.get(
+                        "/", HTTP_ACCEPT_ENCODING="gzip, deflate"
+                    )
+                compress.assert_not_called()
+                self.assertEqual(response["Content-Encoding"], "gzip")
+                self.assertEqual(
+                    gzip.decompress(response.content), plain.content
+                )
+                # Клиент без gzip получает распакованную страницу.
+                self.assertEqual(self.client.get("/").content, plain.content)
+
+    def test_small_pages_are_not_compressed(self):
+        with mock.patch.object(caching, "PAGE_COMPRESS_MIN_SIZE", 10**6):
+            self.client.get("/")
+            response = self.client.get("/", HTTP_ACCEPT_ENCODING="gzip")
+        self.assertNotIn("Content-Encoding", response)
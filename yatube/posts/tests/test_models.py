@@ -1,7 +1,7 @@
 from django.contrib.auth.models import User
 from django.test import TestCase
 
-from ..models import Group, Post
+from ..models import Comment, Follow, Group, Post, UserStats
 
 
 class PostModelTest(TestCase):
@@ -52,3 +52,126 @@ class GroupModelTest(TestCase):
         """__str__  group - это строчка с содержимым group.title."""
         expected_object_name = self.group.title
         self.assertEqual(expected_object_name, str(self.group))
+
+
+class CommentCountTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create(username="Pasha")
+        cls.post = Post.objects.create(
+            text="Тестовый текст", author=cls.author
+        )
+
+    def test_comment_count_follows_comments(self):
+        """comment_count растёт при создании и падает при удалении."""
+        reader = User.objects.create(username="Reader")
+        first = Comment.objects.create(
+            post=self.post, author=reader, text="Раз"
+        )
+        Comment.objects.create(post=self.post, author=self.author, text="Два")
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.comment_count, 2)
+
+        first.delete()
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.comment_count, 1)
+
+    def test_comment_count_after_cascade(self):
+        """Каскадное удаление автора комментариев уменьшает счётчик."""
+        reader = User.objects.create(username="Reader")
+        for text in ("Раз", "Два"):
+            Comment.objects.create(post=self.post, author=reader, text=text)
+
+        reader.delete()
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.comment_count, 0)
+
+    def test_comment_count_is_not_touched_by_edits(self):
+        comment = Comment.objects.create(
+            post=self.post, author=self.author, text="Раз"
+        )
+        comment.text = "Другой текст"
+        comment.save()
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.comment_count, 1)
+
+
+class UserStatsTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create(username="Pasha")
+        cls.reader = User.objects.create(username="Reader")
+
+    def stats(self, user):
+        return UserStats.objects.get(user=user)
+
+    def test_stats_created_with_user(self):
+        stats = self.stats(self.author)
+        self.assertEqual(
+            (
+                stats.followers_count,
+                stats.following_count,
+                stats.posts_count,
+            ),
+            (0, 0, 0),
+        )
+
+    def test_posts_count_follows_posts(self):
+        post = Post.objects.create(text="Раз", author=self.author)
+        Post.objects.create(text="Два", author=self.author)
+        self.assertEqual(self.stats(self.author).posts_count, 2)
+        post.delete()
+        self.assertEqual(self.stats(self.author).posts_count, 1)
+
+    def test_follow_counters_follow_subscriptions(self):
+        follow = Follow.objects.create(user=self.reader, author=self.author)
+        self.assertEqual(self.stats(self.author).followers_count, 1)
+        self.assertEqual(self.stats(self.reader).following_count, 1)
+        follow.delete()
+        self.assertEqual(self.stats(self.author).followers_count, 0)
+        self.assertEqual(self.stats(self.reader).following_count, 0)
+
+    def test_deleted_follower_is_uncounted(self):
+        follower = User.objects.create(username="Follower")
+        Follow.objects.create(user=follower, author=self.author)
+        follower.delete()
+        self.assertEqual(self.stats(self.author).followers_count, 0)
+
+    def test_bump_recreates_missing_row(self):
+        UserStats.objects.filter(user=self.author).delete()
+        Post.objects.create(text="Раз", author=self.author)
+        self.assertEqual(self.stats(self.author).posts_count, 1)
+
+
+class GroupPostsCountTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create(username="Pasha")
+        cls.cats = Group.objects.create(title="Коты", slug="cats")
+        cls.dogs = Group.objects.create(title="Собаки", slug="dogs")
+
+    def count(self, group):
+        return Group.objects.get(pk=group.pk).posts_count
+
+    def test_posts_count_follows_posts(self):
+        post = Post.objects.create(
+            text="Раз", author=self.author, group=self.cats
+        )
+        Post.objects.create(text="Без группы", author=self.author)
+        self.assertEqual(self.count(self.cats), 1)
+        post.delete()
+        self.assertEqual(self.count(self.cats), 0)
+
+    def test_moved_post_is_recounted(self):
+        Post.objects.create(text="Раз", author=self.author, group=self.cats)
+        post = Post.objects.get(text="Раз")
+        post.group = self.dogs
+        post.save()
+        self.assertEqual(self.count(self.cats), 0)
+        self.assertEqual(self.count(self.dogs), 1)
+        post.text = "Правка"
+        post.save()
+        self.assertEqual(self.count(self.dogs), 1)
@@ -0,0 +1,120 @@
+import re
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import connection
+from django.test import Client, TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from ..models import Comment, Follow, Group, Post, UserStats
+
+User = get_user_model()
+
+# Полный проход по таблице без индекса: «SCAN posts_post», но не
+# «SCAN posts_post USING INDEX …» и не проход по уже ограниченному
+# подзапросу.
+FULL_SCAN = re.compile(r"^SCAN (?:TABLE )?(\w+)$")
+
+
+def bad_steps(sql):
+    """Шаги плана с полным проходом по таблице или сортировкой."""
+    tables = set(connection.introspection.table_names())
+    with connection.cursor() as cursor:
+        cursor.execute("EXPLAIN QUERY PLAN " + sql)
+        plan = [row[-1] for row in cursor.fetchall()]
+    return [
+        step
+        for step in plan
+        if "USE TEMP B-TREE" in step
+        or (FULL_SCAN.match(step) and FULL_SCAN.match(step)[1] in tables)
+    ]
+
+
+class FeedQueryPlanTest(TestCase):
+    """Каждый запрос лент идёт по индексу и не сортирует строки сам."""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+
+        cls.author = User.objects.create(username="Pasha")
+        cls.reader = User.objects.create(username="Reader")
+        cls.group = Group.objects.create(title="Заголовок", slug="slug")
+        Follow.objects.create(user=cls.reader, author=cls.author)
+        for i in range(15):
+            Post.objects.create(
+                text=f"Запись {i}", author=cls.author, group=cls.group
+            )
+        cls.post = Post.objects.first()
+        Comment.objects.create(post=cls.post, author=cls.reader, text="Да")
+
+    def setUp(self):
+        self.client = Client()
+        self.client.force_login(self.reader)
+        cache.clear()
+
+    def assertIndexedQueries(self, url):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        for query in queries:
+            if query["sql"].startswith("SELECT"):
+                with self.subTest(url=url, sql=query["sql"]):
+                    self.assertEqual(bad_steps(query["sql"]), [])
+        return response
+
+    def assertIndexedFeed(self, name, **kwargs):
+        url = reverse(name, kwargs=kwargs)
+        page = self.assertIndexedQueries(url).context["page"]
+        self.assertIndexedQueries(f"{url}?page=2")
+        page = self.assertIndexedQueries(
+            f"{url}?after={page.next_cursor}"
+        ).context["page"]
+        self.assertIndexedQueries(f"{url}?before={page.previous_cursor}")
+
+    def test_index(self):
+        self.assertIndexedFeed("index")
+
+    def test_group_posts(self):
+        self.assertIndexedFeed("group_posts", slug="slug")
+
+    def test_profile(self):
+        self.assertIndexedFeed("profile", username="Pasha")
+
+    def test_follow_index(self):
+        self.assertIndexedFeed("follow_index")
+
+    def test_follow_index_with_pulled_authors(self):
+        UserStats.objects.filter(user=self.author).update(fanned_out=False)
+        self.assertIndexedFeed("follow_index")
+
+    def test_post_view(self):
+        self.assertIndexedQueries(
+            reverse(
+                "post", kwargs={"username": "Pasha", "post_id": self.post.pk}
+            )
+        )
+
+    def test_post_comments(self):
+        for i in range(25):
+            Comment.objects.create(
+                post=self.post, author=self.reader, text=f"Ещё {i}"
+            )
+        kwargs = {"username": "Pasha", "post_id": self.post.pk}
+        comments = self.assertIndexedQueries(
+            reverse("post", kwargs=kwargs)
+        ).context["comments"]
+        self.assertIndexedQueries(
+            reverse("post_comments", kwargs=kwargs)
+            + f"?after={comments.next_cursor}"
+        )
+
+    def test_followers_of_author(self):
+        # Рассылка нового поста по таймлайнам ищет подписчиков автора.
+        sql = str(
+            Follow.objects.filter(author=self.author)
+            .values_list("user_id", flat=True)
+            .query
+        )
+        self.assertEqual(bad_steps(sql), [])
@@ -1,15 +1,20 @@
 import shutil
 import tempfile
+from unittest import mock
 
 from django import forms
 from django.conf import settings
 from django.contrib.auth import get_user_model
 from django.core.cache import cache
 from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import connection
 from django.test import Client, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
+from sorl.thumbnail import delete
 
-from ..models import Follow, Group, Post
+from .. import thumbnails, timeline
+from ..models import Comment, Follow, Group, Post, TimelineEntry, UserStats
 
 User = get_user_model()
 
@@ -123,6 +128,15 @@ class PostPagesTests(TestCase):
         self.assertEqual(form_field, self.post)
         self.assertEqual(form_field.image, self.post.image)
 
+    def test_profile_without_stats_row(self):
+        """Профиль пользователя из фикстуры без строки счётчиков."""
+        UserStats.objects.filter(user=self.user).delete()
+        for url in ("/Pasha/", "/Pasha/69/"):
+            with self.subTest(url=url):
+                response = self.guest_client.get(url)
+                self.assertEqual(response.status_code, 200)
+                self.assertContains(response, "Записей: 0")
+
     def test_post_view_page_shows_correct_context(self):
         """Шаблон post_view сформирован с правильным контекстом."""
         url_reverse = reverse(
@@ -205,6 +219,226 @@ class PaginatorViewsTest(TestCase):
             self.assertEqual(len(response.context.get("page").object_list), 2)
 
 
+# Страница обновляется в самом запросе, а не в фоне, поэтому изменения
+# видны сразу.
+@override_settings(FEED_REFRESH_WORKERS=0)
+class CursorPaginatorViewsTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+
+        cls.user = User.objects.create(username="Pasha", id="1")
+
+        Post.objects.bulk_create(
+            Post(text=f"Тестовый заголовок{i}", author=cls.user)
+            for i in range(1, 66)
+        )
+
+    def setUp(self):
+        self.client = Client()
+        cache.clear()
+
+    def walk(self, url):
+        """Пройти ленту курсорами ``after`` до конца."""
+        seen = []
+        response = self.client.get(url)
+        while True:
+            page = response.context["page"]
+            seen.extend(post.id for post in page.object_list)
+            if not page.has_next():
+                return seen, page
+            response = self.client.get(f"{url}?after={page.next_cursor}")
+
+    def test_cursors_walk_whole_feed_in_order(self):
+        """Курсоры ``after`` обходят всю ленту без пропусков и повторов."""
+        expected = list(
+            Post.objects.order_by("-pub_date", "-pk").values_list(
+                "id", flat=True
+            )
+        )
+        for url in (
+            reverse("index"),
+            reverse("profile", kwargs={"username": "Pasha"}),
+        ):
+            with self.subTest(url=url):
+                seen, last_page = self.walk(url)
+                self.assertEqual(seen, expected)
+                self.assertEqual(last_page.number, 7)
+
+    def test_new_posts_do_not_shift_cursor_pages(self):
+        """Новые записи не сдвигают уже выданную курсорную страницу."""
+        url = reverse("profile", kwargs={"username": "Pasha"})
+        first = self.client.get(url).context["page"]
+        second_url = f"{url}?after={first.next_cursor}"
+        second = list(self.client.get(second_url).context["page"])
+        Post.objects.create(text="Свежая запись", author=self.user)
+        self.assertEqual(
+            list(self.client.get(second_url).context["page"]), second
+        )
+
+    def test_before_cursor_returns_previous_page(self):
+        url = reverse("profile", kwargs={"username": "Pasha"})
+        first = self.client.get(url).context["page"]
+        response = self.client.get(f"{url}?after={first.next_cursor}")
+        second = response.context["page"]
+        response = self.client.get(f"{url}?before={second.previous_cursor}")
+        back = response.context["page"]
+        self.assertEqual(list(back), list(first))
+        self.assertEqual(back.number, 1)
+        self.assertFalse(back.has_previous())
+
+    def test_numbered_pages_are_limited_to_window(self):
+        url = reverse("profile", kwargs={"username": "Pasha"})
+        page = self.client.get(f"{url}?page=40").context["page"]
+        self.assertEqual(page.number, page.paginator.numbered_pages)
+        self.assertEqual(list(page.paginator.page_range), [1, 2, 3, 4, 5])
+        self.assertTrue(page.has_next())
+
+    def test_broken_cursor_falls_back_to_first_page(self):
+        url = reverse("profile", kwargs={"username": "Pasha"})
+        response = self.client.get(f"{url}?after=garbage")
+        self.assertEqual(response.context["page"].number, 1)
+
+    def test_deep_page_does_not_count_whole_table(self):
+        """Курсорная страница не выполняет COUNT(*) по таблице."""
+        url = reverse("index")
+        first = self.client.get(url).context["page"]
+        with CaptureQueriesContext(connection) as queries:
+            self.client.get(f"{url}?after={first.next_cursor}")
+        sql = [query["sql"] for query in queries.captured_queries]
+        self.assertFalse(any("COUNT(*)" in query for query in sql))
+
+
+class PageWindowTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+
+        cls.user = User.objects.create(username="Pasha")
+        Post.objects.bulk_create(
+            Post(text=f"Запись {i}", author=cls.user) for i in range(295)
+        )
+
+    def setUp(self):
+        self.url = reverse("index")
+        cache.clear()
+
+    def window(self, query=""):
+        response = self.client.get(self.url + query)
+        return response.context["page"], response.context["page"].paginator
+
+    def test_window_is_elided(self):
+        paginator = self.window()[1]
+        self.assertEqual(
+            paginator.window,
+            [
+                (1, None),
+                (2, "page=2"),
+                (3, "page=3"),
+                (None, None),
+                (30, "page=last"),
+            ],
+        )
+
+    def test_last_page_holds_oldest_posts(self):
+        page, paginator = self.window("?page=last")
+        self.assertEqual(page.number, 30)
+        self.assertFalse(page.has_next())
+        self.assertEqual(
+            list(page),
+            list(Post.objects.order_by("pub_date", "pk")[:10])[::-1],
+        )
+        self.assertEqual(
+            paginator.window,
+            [
+                (1, "page=1"),
+                (None, None),
+                (29, f"before={page.previous_cursor}"),
+                (30, None),
+            ],
+        )
+
+    def test_page_size_does_not_grow_with_table(self):
+        first = self.client.get(self.url).content.count(b"page-item")
+        Post.objects.bulk_create(
+            Post(text=f"Ещё {i}", author=self.user) for i in range(700)
+        )
+        cache.clear()
+        self.assertEqual(
+            self.client.get(self.url).content.count(b"page-item"), first
+        )
+
+    def test_total_count_is_cached(self):
+        self.window()
+        Post.objects.bulk_create(
+            Post(text=f"Ещё {i}", author=self.user) for i in range(20)
+        )
+        with CaptureQueriesContext(connection) as queries:
+            paginator = self.window("?page=2")[1]
+        self.assertEqual(paginator.last_page, 30)
+        sql = [query["sql"] for query in queries.captured_queries]
+        self.assertFalse(
+            any(query.startswith("SELECT COUNT(*) AS") for query in sql)
+        )
+
+
+class FeedQueryBudgetTest(TestCase):
+    """Число запросов ленты не зависит от количества карточек на странице."""
+
+    # Вместе с загрузкой сессии и пользователя.
+    BUDGETS = {
+        "index": 4,
+        "group_posts": 6,
+        "profile": 7,
+        "follow_index": 4,
+    }
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+
+        cls.reader = User.objects.create(username="Reader")
+        cls.group = Group.objects.create(title="Заголовок", slug="slug")
+        cls.author = User.objects.create(username="Pasha")
+        for i in range(10):
+            author = User.objects.create(username=f"author{i}")
+            Follow.objects.create(user=cls.reader, author=author)
+            post = Post.objects.create(
+                text=f"Тестовый заголовок{i}", author=author, group=cls.group
+            )
+            Post.objects.create(text="Запись", author=cls.author)
+            Comment.objects.create(post=post, author=cls.reader, text="Да")
+
+    def setUp(self):
+        self.client = Client()
+        self.client.force_login(self.reader)
+        cache.clear()
+
+    def test_feed_views_fit_query_budget(self):
+        urls = {
+            "index": reverse("index"),
+            "group_posts": reverse("group_posts", kwargs={"slug": "slug"}),
+            "profile": reverse("profile", kwargs={"username": "Pasha"}),
+            "follow_index": reverse("follow_index"),
+        }
+        for name, url in urls.items():
+            with self.subTest(view=name):
+                with self.assertNumQueries(self.BUDGETS[name]):
+                    response = self.client.get(url)
+                self.assertEqual(len(response.context["page"]), 10)
+
+    def test_feed_rows_are_hydrated(self):
+        response = self.client.get(reverse("follow_index"))
+        with self.assertNumQueries(0):
+            for post in response.context["page"]:
+                post.author.username
+                post.group.slug
+                self.assertEqual(post.comment_count, 1)
+
+
+# Страница обновляется в самом запросе, а не в фоне, поэтому изменения
+# видны сразу.
+@override_settings(FEED_REFRESH_WORKERS=0)
 class CacheTest(TestCase):
     @classmethod
     def setUpClass(cls):
@@ -231,13 +465,90 @@ class CacheTest(TestCase):
     def test_cache_correct_work(self):
         response = self.guest_client.get(reverse("index"))
         cached_response_content = response.content
-        Post.objects.create(text="Тестовый заголовок", author=self.user)
+        # update() не шлёт сигналов, поэтому кеш о нём не узнает.
+        Post.objects.filter(pk=self.post.pk).update(text="Другой текст")
         response = self.guest_client.get(reverse("index"))
         self.assertEqual(cached_response_content, response.content)
         cache.clear()
         response = self.guest_client.get(reverse("index"))
         self.assertNotEqual(cached_response_content, response.content)
 
+    def test_new_post_invalidates_index(self):
+        """Новая запись сразу появляется на главной."""
+        self.guest_client.get(reverse("index"))
+        Post.objects.create(text="Свежая запись", author=self.user)
+        response = self.guest_client.get(reverse("index"))
+        self.assertContains(response, "Свежая запись")
+
+    def test_changes_invalidate_only_affected_pages(self):
+        """Правка поста со второй страницы не сбрасывает первую."""
+        Post.objects.bulk_create(
+            Post(text=f"Запись{i}", author=self.user) for i in range(10)
+        )
+        first_page = self.guest_client.get(reverse("index")).content
+        Post.objects.filter(text="Запись9").update(text="Тайная правка")
+
+        self.post.text = "Правка на второй странице"
+        self.post.save()
+        response = self.guest_client.get(reverse("index"))
+        self.assertEqual(response.content, first_page)
+
+        Comment.objects.create(
+            post=Post.objects.get(text="Тайная правка"),
+            author=self.user,
+            text="Комментарий",
+        )
+        response = self.guest_client.get(reverse("index"))
+        self.assertContains(response, "Тайная правка")
+
+    def test_group_change_invalidates_its_posts(self):
+        self.guest_client.get(reverse("index"))
+        self.group.title = "Новое название"
+        self.group.save()
+        response = self.guest_client.get(reverse("index"))
+        self.assertContains(response, "Новое название")
+
+
+class PostCardCacheTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+
+        cls.user = User.objects.create(username="Pasha")
+        cls.reader = User.objects.create(username="Reader")
+        cls.post = Post.objects.create(text="Тестовый текст", author=cls.user)
+
+    def setUp(self):
+        self.author_client = Client()
+        self.author_client.force_login(self.user)
+        self.reader_client = Client()
+        self.reader_client.force_login(self.reader)
+        self.url = reverse("profile", kwargs={"username": "Pasha"})
+        cache.clear()
+
+    def test_cards_are_served_from_cache(self):
+        self.reader_client.get(self.url)
+        Post.objects.filter(pk=self.post.pk).update(text="Без новой версии")
+        response = self.reader_client.get(self.url)
+        self.assertContains(response, "Тестовый текст")
+
+    def test_card_changes_with_post_and_comments(self):
+        self.reader_client.get(self.url)
+        self.post.text = "Отредактировано"
+        self.post.save()
+        Comment.objects.create(post=self.post, author=self.reader, text="Да")
+        response = self.reader_client.get(self.url)
+        self.assertContains(response, "Отредактировано")
+        self.assertContains(response, "Комментариев: 1")
+
+    def test_edit_button_is_shown_to_author_only(self):
+        edit_url = reverse(
+            "post_edit", kwargs={"username": "Pasha", "post_id": self.post.pk}
+        )
+        self.assertNotContains(self.reader_client.get(self.url), edit_url)
+        self.assertContains(self.author_client.get(self.url), edit_url)
+        self.assertNotContains(self.reader_client.get(self.url), edit_url)
+
 
 class FollowViewTest(TestCase):
     @classmethod
@@ -304,3 +615,531 @@ class FollowViewTest(TestCase):
         response = self.authorized_client.get(url_reverse)
         form_field = len(response.context["page"].object_list)
         self.assertEqual(form_field, 0)
+
+
+class TimelineTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+
+        cls.reader = User.objects.create(username="Reader")
+        cls.author = User.objects.create(username="Pasha")
+        cls.old_post = Post.objects.create(text="Старая", author=cls.author)
+
+    def setUp(self):
+        self.client = Client()
+        self.client.force_login(self.reader)
+        cache.clear()
+
+    def feed(self):
+        return list(self.client.get(reverse("follow_index")).context["page"])
+
+    def test_follow_backfills_and_unfollow_trims(self):
+        """Подписка добавляет посты автора в таймлайн, отписка убирает."""
+        self.client.get(
+            reverse("profile_follow", kwargs={"username": "Pasha"})
+        )
+        self.assertEqual(self.feed(), [self.old_post])
+
+        self.client.get(
+            reverse("profile_unfollow", kwargs={"username": "Pasha"})
+        )
+        self.assertEqual(self.feed(), [])
+        self.assertFalse(TimelineEntry.objects.filter(user=self.reader))
+
+    def test_new_post_is_fanned_out(self):
+        Follow.objects.create(user=self.reader, author=self.author)
+        new_post = Post.objects.create(text="Новая", author=self.author)
+        self.assertTrue(
+            TimelineEntry.objects.filter(
+                user=self.reader, post=new_post
+            ).exists()
+        )
+        self.assertEqual(self.feed(), [new_post, self.old_post])
+
+    @override_settings(FANOUT_FOLLOWERS_LIMIT=0)
+    def test_popular_author_is_merged_on_read(self):
+        """Посты популярных авторов не раскладываются, а подмешиваются."""
+        Follow.objects.create(user=self.reader, author=self.author)
+        quiet = User.objects.create(username="Quiet")
+        quiet_post = Post.objects.create(text="Тихая", author=quiet)
+        TimelineEntry.objects.create(
+            user=self.reader,
+            post=quiet_post,
+            author=quiet,
+            pub_date=quiet_post.pub_date,
+        )
+        new_post = Post.objects.create(text="Новая", author=self.author)
+
+        self.assertFalse(TimelineEntry.objects.filter(author=self.author))
+        self.assertEqual(self.feed(), [new_post, quiet_post, self.old_post])
+
+    @override_settings(
+        FANOUT_FOLLOWERS_LIMIT=2,
+        FANOUT_RESUME_FOLLOWERS=1,
+        FEED_REFRESH_WORKERS=0,
+    )
+    def test_author_back_under_limit_is_fanned_out_again(self):
+        """Посты, вышедшие, пока автор был популярен, не теряются."""
+        # В TestCase коммита нет, а таймлайны перестраиваются после него.
+        patcher = mock.patch(
+            "django.db.transaction.on_commit", side_effect=lambda f: f()
+        )
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        first, second = (
+            User.objects.create(username=name) for name in ("Ann", "Bob")
+        )
+        for user in (self.reader, first, second):
+            Follow.objects.create(user=user, author=self.author)
+        self.assertFalse(TimelineEntry.objects.filter(author=self.author))
+        new_post = Post.objects.create(text="Новая", author=self.author)
+
+        # Между порогами автор остаётся на подмешивании.
+        Follow.objects.get(user=second).delete()
+        self.assertFalse(TimelineEntry.objects.filter(author=self.author))
+        self.assertEqual(self.feed(), [new_post, self.old_post])
+
+        Follow.objects.get(user=first).delete()
+        self.assertEqual(self.feed(), [new_post, self.old_post])
+        self.assertEqual(
+            TimelineEntry.objects.filter(user=self.reader).count(), 2
+        )
+
+    @override_settings(FANOUT_FOLLOWERS_LIMIT=0, FEED_REFRESH_WORKERS=1)
+    def test_timelines_are_rebuilt_in_background(self):
+        executor = mock.Mock()
+        with mock.patch(
+            "django.db.transaction.on_commit", side_effect=lambda f: f()
+        ), mock.patch.object(
+            timeline.caching, "get_executor", return_value=executor
+        ):
+            Follow.objects.create(user=self.reader, author=self.author)
+        executor.submit.assert_called_once_with(
+            timeline._run_rebuild, self.author.pk, False
+        )
+
+    @override_settings(TIMELINE_BACKFILL_POSTS=1)
+    def test_backfill_takes_latest_posts(self):
+        new_post = Post.objects.create(text="Новая", author=self.author)
+        Follow.objects.create(user=self.reader, author=self.author)
+        self.assertEqual(self.feed(), [new_post])
+
+    def test_queries_do_not_depend_on_followed_authors(self):
+        for i in range(30):
+            author = User.objects.create(username=f"author{i}")
+            Follow.objects.create(user=self.reader, author=author)
+            for _ in range(2):
+                Post.objects.create(text="Запись", author=author)
+        with self.assertNumQueries(4):
+            page = self.client.get(reverse("follow_index")).context["page"]
+        with self.assertNumQueries(4):
+            self.client.get(
+                reverse("follow_index") + f"?after={page.next_cursor}"
+            )
+
+
+@override_settings(MEDIA_ROOT=tempfile.mkdtemp())
+class ThumbnailTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+
+        cls.user = User.objects.create(username="Pasha")
+        small_gif = (
+            b"\x47\x49\x46\x38\x39\x61\x02\x00"
+            b"\x01\x00\x80\x00\x00\x00\x00\x00"
+            b"\xFF\xFF\xFF\x21\xF9\x04\x00\x00"
+            b"\x00\x00\x00\x2C\x00\x00\x00\x00"
+            b"\x02\x00\x01\x00\x00\x02\x02\x0C"
+            b"\x0A\x00\x3B"
+        )
+        cls.uploaded = SimpleUploadedFile(
+            name="thumb.gif", content=small_gif, content_type="image/gif"
+        )
+        cls.post = Post.objects.create(
+            text="С картинкой", author=cls.user, image=cls.uploaded
+        )
+
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(settings.MEDIA_ROOT, ignore_errors=True)
+        super().tearDownClass()
+
+    def setUp(self):
+        self.client = Client()
+        self.client.force_login(self.user)
+        self.url = reverse(
+            "post", kwargs={"username": "Pasha", "post_id": self.post.pk}
+        )
+        cache.clear()
+
+    def test_original_image_is_shown_until_thumbnail_is_ready(self):
+        response = self.client.get(self.url)
+        self.assertContains(response, self.post.image.url)
+
+    def test_generate_stores_thumbnail_url(self):
+        thumbnails.generate(self.post.pk)
+        # sorl хранит миниатюры своим хранилищем, мимо MEDIA_ROOT теста.
+        self.addCleanup(delete, self.post.image, delete_file=False)
+        self.post.refresh_from_db()
+        self.assertTrue(self.post.thumbnail)
+        self.assertContains(self.client.get(self.url), self.post.thumbnail)
+
+    def test_new_image_is_queued_for_thumbnail(self):
+        self.uploaded.seek(0)
+        with mock.patch.object(thumbnails, "enqueue") as enqueue:
+            self.client.post(
+                reverse("new_post"),
+                {"text": "Новый", "image": self.uploaded},
+            )
+        post = Post.objects.get(text="Новый")
+        enqueue.assert_called_once_with(post)
+
+    def test_changed_image_resets_thumbnail(self):
+        Post.objects.filter(pk=self.post.pk).update(thumbnail="/old.jpg")
+        self.uploaded.seek(0)
+        with mock.patch.object(thumbnails, "enqueue") as enqueue:
+            self.client.post(
+                reverse(
+                    "post_edit",
+                    kwargs={"username": "Pasha", "post_id": self.post.pk},
+                ),
+                {"text": "Новая картинка", "image": self.uploaded},
+            )
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.thumbnail, "")
+        enqueue.assert_called_once_with(self.post)
+
+
+class SearchTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+
+        cls.user = User.objects.create(username="Pasha")
+        cls.other = User.objects.create(username="Masha")
+        cls.group = Group.objects.create(title="Коты", slug="cats")
+        cls.best = Post.objects.create(
+            text="Кот, кот и ещё раз кот", author=cls.user, group=cls.group
+        )
+        cls.worse = Post.objects.create(
+            text="Про кота и про всё остальное на свете понемногу",
+            author=cls.other,
+        )
+        cls.missing = Post.objects.create(text="Про собак", author=cls.user)
+
+    def setUp(self):
+        self.url = reverse("search")
+        cache.clear()
+
+    def found(self, **params):
+        response = self.client.get(self.url, params)
+        self.assertEqual(response.status_code, 200)
+        return list(response.context["page"])
+
+    def test_results_are_ranked_by_relevance(self):
+        self.assertEqual(self.found(q="кот"), [self.best, self.worse])
+
+    def test_results_are_filtered(self):
+        self.assertEqual(self.found(q="кот", group="cats"), [self.best])
+        self.assertEqual(self.found(q="кот", author="Masha"), [self.worse])
+
+    def test_unknown_author_is_a_form_error(self):
+        response = self.client.get(self.url, {"q": "кот", "author": "Nobody"})
+        self.assertTrue(response.context["form"].errors)
+        self.assertIsNone(response.context["page"])
+
+    def test_query_syntax_is_not_passed_to_fts(self):
+        self.assertEqual(self.found(q='собак" OR (кот'), [])
+        self.assertEqual(self.found(q="собак OR"), [])
+
+    def test_index_follows_edits_and_deletes(self):
+        self.missing.text = "Про котов"
+        self.missing.save()
+        self.assertIn(self.missing, self.found(q="кот"))
+        self.missing.delete()
+        self.assertEqual(self.found(q="кот"), [self.best, self.worse])
+
+    def test_cursor_pages_keep_query_and_cover_all_results(self):
+        Post.objects.bulk_create(
+            Post(text=f"Кот номер {i}", author=self.user) for i in range(25)
+        )
+        response = self.client.get(self.url, {"q": "кот"})
+        seen = list(response.context["page"])
+        self.assertContains(response, "q=%D0%BA%D0%BE%D1%82&amp;after=")
+        for _ in range(5):
+            page = response.context["page"]
+            if not page.has_next():
+                break
+            response = self.client.get(
+                self.url, {"q": "кот", "after": page.next_cursor}
+            )
+            seen += list(response.context["page"])
+        self.assertEqual(len(seen), 27)
+        self.assertEqual(len(set(seen)), 27)
+
+        response = self.client.get(
+            self.url, {"q": "кот", "before": page.previous_cursor}
+        )
+        self.assertEqual(list(response.context["page"]), seen[10:20])
+
+    def test_admin_search_uses_index(self):
+        admin = User.objects.create_superuser("admin", "a@a.ru", "pass")
+        self.client.force_login(admin)
+        response = self.client.get(
+            reverse("admin:posts_post_changelist"), {"q": "кот"}
+        )
+        self.assertEqual(
+            set(response.context["cl"].result_list), {self.best, self.worse}
+        )
+
+
+# Страница обновляется в самом запросе, а не в фоне, поэтому изменения
+# видны сразу.
+@override_settings(FEED_REFRESH_WORKERS=0)
+class GroupPageCacheTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+
+        cls.user = User.objects.create(username="Pasha")
+        cls.group = Group.objects.create(title="Коты", slug="cats")
+        for i in range(12):
+            Post.objects.create(
+                text=f"Запись {i}", author=cls.user, group=cls.group
+            )
+
+    def setUp(self):
+        self.url = reverse("group_posts", kwargs={"slug": "cats"})
+        cache.clear()
+
+    def test_page_with_header_is_cached(self):
+        self.assertContains(self.client.get(self.url), "Записей: 12")
+        # Остаётся только сверка версии группы для условного GET.
+        with self.assertNumQueries(1):
+            self.assertContains(self.client.get(self.url), "Записей: 12")
+
+    def test_header_follows_group_posts_on_cursor_pages(self):
+        page = self.client.get(self.url).context["page"]
+        url = f"{self.url}?after={page.next_cursor}"
+        self.assertContains(self.client.get(url), "Записей: 12")
+
+        Post.objects.create(text="Новая", author=self.user, group=self.group)
+        self.assertContains(self.client.get(url), "Записей: 13")
+
+    def test_posts_outside_group_keep_page_cached(self):
+        self.client.get(self.url)
+        Post.objects.create(text="Без группы", author=self.user)
+        with self.assertNumQueries(1):
+            self.client.get(self.url)
+
+
+@override_settings(FEED_REFRESH_WORKERS=0)
+class ProfilePageCacheTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+
+        cls.author = User.objects.create(username="Pasha")
+        cls.reader = User.objects.create(username="Masha")
+        Post.objects.create(text="Запись", author=cls.author)
+
+    def setUp(self):
+        self.url = reverse("profile", kwargs={"username": "Pasha"})
+        cache.clear()
+
+    def test_page_is_cached(self):
+        self.client.get(self.url)
+        with self.assertNumQueries(1):
+            self.assertContains(self.client.get(self.url), "Записей: 1")
+
+    def test_counters_follow_posts_and_followers(self):
+        self.assertContains(self.client.get(self.url), "Подписчиков: 0")
+        Follow.objects.create(user=self.reader, author=self.author)
+        self.assertContains(self.client.get(self.url), "Подписчиков: 1")
+        Post.objects.create(text="Ещё", author=self.author)
+        self.assertContains(self.client.get(self.url), "Записей: 2")
+
+    def test_follow_button_is_per_user(self):
+        self.client.force_login(self.reader)
+        self.assertContains(self.client.get(self.url), "Подписаться")
+        Follow.objects.create(user=self.reader, author=self.author)
+        self.assertContains(self.client.get(self.url), "Отписаться")
+
+
+@override_settings(FEED_REFRESH_WORKERS=0)
+class PostPageCacheTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+
+        cls.author = User.objects.create(username="Pasha")
+        cls.reader = User.objects.create(username="Masha")
+        cls.post = Post.objects.create(text="Запись", author=cls.author)
+
+    def setUp(self):
+        kwargs = {"username": "Pasha", "post_id": self.post.pk}
+        self.url = reverse("post", kwargs=kwargs)
+        self.comment_url = reverse("add_comment", kwargs=kwargs)
+        cache.clear()
+        self.client = Client(enforce_csrf_checks=True)
+        self.client.force_login(self.reader)
+
+    def test_page_has_no_csrf_token(self):
+        self.client.get(self.url)
+        # Остаются версия записи, сессия и пользователь.
+        with self.assertNumQueries(3):
+            response = self.client.get(self.url)
+        self.assertContains(response, 'name="csrfmiddlewaretoken">')
+        self.assertNotIn("csrftoken", response.cookies)
+
+    def test_comment_with_fetched_token(self):
+        self.client.get(self.url)
+        response = self.client.post(self.comment_url, {"text": "Без токена"})
+        self.assertEqual(response.status_code, 403)
+        token = self.client.get(reverse("csrf_token")).json()["token"]
+        self.client.post(
+            self.comment_url,
+            {"text": "Первый", "csrfmiddlewaretoken": token},
+        )
+        self.assertContains(self.client.get(self.url), "Первый")
+
+    def test_edit_resets_page(self):
+        self.assertContains(self.client.get(self.url), "Запись")
+        self.post.text = "Исправленная запись"
+        self.post.save()
+        self.assertContains(self.client.get(self.url), "Исправленная запись")
+
+
+@override_settings(FEED_REFRESH_WORKERS=0)
+class ConditionalGetTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+
+        cls.author = User.objects.create(username="Pasha")
+        cls.reader = User.objects.create(username="Masha")
+        cls.group = Group.objects.create(title="Коты", slug="cats")
+        cls.post = Post.objects.create(
+            text="Запись", author=cls.author, group=cls.group
+        )
+        cls.urls = {
+            "group_posts": reverse("group_posts", kwargs={"slug": "cats"}),
+            "profile": reverse("profile", kwargs={"username": "Pasha"}),
+            "post": reverse(
+                "post", kwargs={"username": "Pasha", "post_id": cls.post.pk}
+            ),
+        }
+
+    def setUp(self):
+        cache.clear()
+
+    def assertNotModified(self, url, **headers):
+        # Ответ 304 стоит одного запроса версий.
+        with self.assertNumQueries(1):
+            response = self.client.get(url, **headers)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response.content, b"")
+
+    def assertModified(self, url, **headers):
+        response = self.client.get(url, **headers)
+        self.assertEqual(response.status_code, 200)
+        return response
+
+    def test_unchanged_pages_are_not_modified(self):
+        for name, url in self.urls.items():
+            with self.subTest(name=name):
+                response = self.assertModified(url)
+                self.assertEqual(response["Cache-Control"], "no-cache")
+                self.assertNotModified(
+                    url, HTTP_IF_NONE_MATCH=response["ETag"]
+                )
+                self.assertNotModified(
+                    url, HTTP_IF_MODIFIED_SINCE=response["Last-Modified"]
+                )
+
+    def test_comment_changes_every_page(self):
+        etags = {
+            name: self.client.get(url)["ETag"]
+            for name, url in self.urls.items()
+        }
+        Comment.objects.create(post=self.post, author=self.reader, text="Да")
+        for name, url in self.urls.items():
+            with self.subTest(name=name):
+                self.assertModified(url, HTTP_IF_NONE_MATCH=etags[name])
+
+    def test_profile_changes_with_followers(self):
+        url = self.urls["profile"]
+        etag = self.client.get(url)["ETag"]
+        Follow.objects.create(user=self.reader, author=self.author)
+        response = self.assertModified(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertContains(response, "Подписчиков: 1")
+
+    def test_group_changes_with_new_post(self):
+        url = self.urls["group_posts"]
+        etag = self.client.get(url)["ETag"]
+        Post.objects.create(text="Новая", author=self.reader, group=self.group)
+        self.assertModified(url, HTTP_IF_NONE_MATCH=etag)
+
+    def test_validators_depend_on_viewer(self):
+        url = self.urls["post"]
+        etag = self.client.get(url)["ETag"]
+        self.client.force_login(self.reader)
+        response = self.assertModified(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response["Cache-Control"], "no-cache, private")
+
+    def test_missing_page(self):
+        response = self.client.get(
+            reverse("profile", kwargs={"username": "nobody"})
+        )
+        self.assertFalse(response.has_header("ETag"))
+
+
+@override_settings(FEED_REFRESH_WORKERS=0)
+class PostCommentsTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+
+        cls.author = User.objects.create(username="Pasha")
+        cls.post = Post.objects.create(text="Вирусный", author=cls.author)
+
+    def setUp(self):
+        cache.clear()
+        kwargs = {"username": "Pasha", "post_id": self.post.pk}
+        self.url = reverse("post", kwargs=kwargs)
+        self.more_url = reverse("post_comments", kwargs=kwargs)
+
+    def comment(self, count):
+        for i in range(count):
+            commenter = User.objects.create(username=f"reader{i}")
+            Comment.objects.create(
+                post=self.post, author=commenter, text=f"Комментарий {i}"
+            )
+
+    def test_query_count_does_not_depend_on_comments(self):
+        with self.assertNumQueries(3):
+            self.client.get(self.url)
+        self.comment(45)
+        with self.assertNumQueries(3):
+            response = self.client.get(self.url)
+        self.assertEqual(len(response.context["comments"]), 20)
+        self.assertContains(response, "reader44")
+
+    def test_load_more_fragments_cover_all_comments(self):
+        self.comment(45)
+        comments = self.client.get(self.url).context["comments"]
+        seen = list(comments)
+        while comments.has_next():
+            response = self.client.get(
+                self.more_url + f"?after={comments.next_cursor}"
+            )
+            self.assertNotContains(response, "<html")
+            comments = response.context["comments"]
+            seen += list(comments)
+        self.assertEqual(len(seen), 45)
+        self.assertEqual(
+            seen, list(Comment.objects.order_by("-created", "-id"))
+        )
+        self.assertNotContains(response, "Показать ещё")
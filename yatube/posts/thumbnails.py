@@ -0,0 +1,65 @@
+import logging
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.utils import timezone
+from sorl.thumbnail import get_thumbnail
+
+from . import caching
+from .models import Post
+
+logger = logging.getLogger(__name__)
+
+# Размер и параметры миниатюры карточки поста (post_item.html, post.html).
+GEOMETRY = "600x300"
+OPTIONS = {"crop": "center", "upscale": True}
+
+_executor = None
+
+
+def _get_executor():
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(
+            max_workers=settings.THUMBNAIL_WORKERS,
+            thread_name_prefix="thumbnails",
+        )
+    return _executor
+
+
+def enqueue(post):
+    """Поставить генерацию миниатюры в очередь после коммита поста."""
+    if post.image and not post.thumbnail:
+        transaction.on_commit(lambda: _submit(post.pk))
+
+
+def _submit(post_id):
+    if settings.THUMBNAIL_WORKERS:
+        _get_executor().submit(_run, post_id)
+    else:
+        # Без воркеров миниатюра создаётся сразу, в потоке запроса.
+        generate(post_id)
+
+
+def _run(post_id):
+    try:
+        generate(post_id)
+    except Exception:
+        logger.exception("Не удалось создать миниатюру поста %s", post_id)
+    finally:
+        # Воркер живёт в своём потоке со своим соединением с БД.
+        connection.close()
+
+
+def generate(post_id):
+    """Создать миниатюру поста и сохранить её URL в Post.thumbnail."""
+    post = Post.objects.filter(pk=post_id).only("image").first()
+    if post is None or not post.image:
+        return
+    url = get_thumbnail(post.image, GEOMETRY, **OPTIONS).url
+    # update() не трогает auto_now, поэтому версия поста сдвигается явно.
+    Post.objects.filter(pk=post_id, image=post.image.name).update(
+        thumbnail=url, updated=timezone.now()
+    )
+    caching.purge(caching.post_tag(post_id))
@@ -0,0 +1,156 @@
+import logging
+
+from django.conf import settings
+from django.db import connection, transaction
+
+from . import caching
+from .models import Follow, Post, TimelineEntry, UserStats
+
+logger = logging.getLogger(__name__)
+
+BATCH_SIZE = 1000
+
+
+def is_fanned_out(author_id):
+    """Раскладываются ли посты автора по таймлайнам подписчиков."""
+    fanned_out = (
+        UserStats.objects.filter(user_id=author_id)
+        .values_list("fanned_out", flat=True)
+        .first()
+    )
+    return fanned_out is not False
+
+
+def pulled_authors(user):
+    """Авторы из подписок пользователя, чьи посты подмешиваются при чтении."""
+    return list(
+        Follow.objects.filter(
+            user=user, author__stats__fanned_out=False
+        ).values_list("author_id", flat=True)
+    )
+
+
+def fan_out(post):
+    """Разложить новый пост по таймлайнам подписчиков автора."""
+    if not is_fanned_out(post.author_id):
+        return
+    followers = Follow.objects.filter(author_id=post.author_id).values_list(
+        "user_id", flat=True
+    )
+    TimelineEntry.objects.bulk_create(
+        (
+            TimelineEntry(
+                user_id=user_id,
+                post=post,
+                author_id=post.author_id,
+                pub_date=post.pub_date,
+            )
+            for user_id in followers.iterator()
+        ),
+        batch_size=BATCH_SIZE,
+        ignore_conflicts=True,
+    )
+
+
+def _fill(user_ids, author_id):
+    """Разложить последние посты автора по таймлайнам ``user_ids``.
+
+    Берутся только TIMELINE_BACKFILL_POSTS последних постов: более
+    старые остаются в профиле автора, а не в ленте подписок.
+    """
+    posts = list(
+        Post.objects.filter(author_id=author_id)
+        .order_by("-pub_date", "-id")
+        .values_list("pk", "pub_date")[: settings.TIMELINE_BACKFILL_POSTS]
+    )
+    with transaction.atomic():
+        TimelineEntry.objects.bulk_create(
+            (
+                TimelineEntry(
+                    user_id=user_id,
+                    post_id=pk,
+                    author_id=author_id,
+                    pub_date=pub_date,
+                )
+                for user_id in user_ids
+                for pk, pub_date in posts
+            ),
+            batch_size=BATCH_SIZE,
+            ignore_conflicts=True,
+        )
+
+
+def backfill(user_id, author_id):
+    """Добавить в таймлайн подписчика уже опубликованные посты автора."""
+    if is_fanned_out(author_id):
+        _fill([user_id], author_id)
+
+
+def trim(user_id, author_id):
+    """Убрать посты автора из таймлайна отписавшегося пользователя."""
+    TimelineEntry.objects.filter(user_id=user_id, author_id=author_id).delete()
+
+
+def update_fan_out(author_id):
+    """Переключить автора между раскладкой и подмешиванием при чтении.
+
+    Вызывается после изменения числа подписчиков. Автор, у которого их
+    больше FANOUT_FOLLOWERS_LIMIT, переходит на подмешивание, а обратно —
+    только когда их не больше FANOUT_RESUME_FOLLOWERS: иначе автор на
+    пороге переключался бы при каждой подписке и отписке. При переходе
+    посты автора убираются из таймлайнов, а при возврате раскладываются
+    по таймлайнам всех подписчиков заново: иначе посты, вышедшие, пока он
+    был популярен, не попали бы ни в таймлайн, ни в подмешивание. Это
+    делается после коммита в фоновых потоках кеша.
+    """
+    stats = (
+        UserStats.objects.filter(user_id=author_id)
+        .values_list("followers_count", "fanned_out")
+        .first()
+    )
+    if stats is None:
+        return
+    followers, fanned_out = stats
+    if fanned_out:
+        push = followers <= settings.FANOUT_FOLLOWERS_LIMIT
+    else:
+        push = followers <= settings.FANOUT_RESUME_FOLLOWERS
+    if push == fanned_out:
+        return
+    # Из одновременных запросов переключает только один.
+    if UserStats.objects.filter(
+        user_id=author_id, fanned_out=fanned_out
+    ).update(fanned_out=push):
+        transaction.on_commit(lambda: _submit_rebuild(author_id, push))
+
+
+def _submit_rebuild(author_id, push):
+    if settings.FEED_REFRESH_WORKERS:
+        caching.get_executor().submit(_run_rebuild, author_id, push)
+    else:
+        _rebuild(author_id, push)
+
+
+def _run_rebuild(author_id, push):
+    try:
+        _rebuild(author_id, push)
+    except Exception:
+        logger.exception(
+            "Не удалось перестроить таймлайны автора %s", author_id
+        )
+    finally:
+        # Воркер живёт в своём потоке со своим соединением с БД.
+        connection.close()
+
+
+def _rebuild(author_id, push):
+    """Разложить посты автора по таймлайнам подписчиков или убрать их."""
+    if push:
+        _fill(
+            Follow.objects.filter(author_id=author_id).values_list(
+                "user_id", flat=True
+            ),
+            author_id,
+        )
+    else:
+        TimelineEntry.objects.filter(author_id=author_id).delete()
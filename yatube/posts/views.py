@@ -1,57 +1,166 @@
 from django.contrib.auth.decorators import login_required
-from django.core.paginator import Paginator
+from django.db import transaction
+from django.db.models import OuterRef, Subquery
 from django.shortcuts import get_object_or_404, redirect, render
-from django.views.decorators.cache import cache_page
 from django.views.decorators.http import require_GET
 
-from .forms import CommentForm, PostForm
-from .models import Follow, Group, Post, User
+from . import search as fts
+from . import thumbnails, timeline
+from .caching import (
+    author_tag,
+    cache_feed_page,
+    comments_tag,
+    conditional_page,
+    feed_tags,
+    group_feed_tag,
+    group_tag,
+    post_tag,
+)
+from .forms import CommentForm, PostForm, SearchForm
+from .models import (
+    Comment,
+    Follow,
+    Group,
+    Post,
+    TimelineEntry,
+    User,
+    UserStats,
+)
+from .paginators import (
+    CommentPaginator,
+    CursorPaginator,
+    SearchPaginator,
+    TimelinePaginator,
+)
+
+COMMENTS_PER_PAGE = 20
+
+
+def _row(queryset):
+    """Первая строка: при поиске по ключу сортировка не нужна."""
+    return next(iter(queryset.order_by()[:1]), None)
+
+
+def _stats(author):
+    """Счётчики автора; у пользователей из фикстур их строки может не быть."""
+    try:
+        return author.stats
+    except UserStats.DoesNotExist:
+        author.stats, _ = UserStats.objects.get_or_create(user=author)
+        return author.stats
+
+
+def _latest_update(posts):
+    """Подзапрос: время последней правки из ``posts`` по индексу."""
+    return Subquery(posts.order_by("-updated").values("updated")[:1])
+
+
+def _group_versions(request, slug):
+    return _row(
+        Group.objects.filter(slug=slug)
+        .annotate(
+            latest=_latest_update(Post.objects.filter(group=OuterRef("pk")))
+        )
+        .values_list("updated", "latest")
+    )
+
+
+def _profile_versions(request, username):
+    return _row(
+        User.objects.filter(username=username)
+        .annotate(
+            latest=_latest_update(Post.objects.filter(author=OuterRef("pk")))
+        )
+        .values_list("stats__updated", "latest")
+    )
+
+
+def _post_versions(request, username, post_id):
+    return _row(
+        Post.objects.filter(id=post_id, author__username=username).values_list(
+            "updated", "author__stats__updated"
+        )
+    )
 
 
 @require_GET
-@cache_page(20, key_prefix="index_page")
+@cache_feed_page("index_page")
 def index(request):
-    posts = Post.objects.all()
+    posts = Post.objects.for_feed()
 
-    paginator = Paginator(posts, 10)
-    page_number = request.GET.get("page")
-    page = paginator.get_page(page_number)
+    paginator = CursorPaginator(posts, 10)
+    page = paginator.get_cursor_page(request.GET)
 
-    return render(
+    response = render(
         request,
         "index.html",
         {"page": page},
     )
+    response.cache_tags = feed_tags(request, page)
+    return response
 
 
 @require_GET
+@conditional_page(_group_versions)
+@cache_feed_page("group_page")
 def group_posts(request, slug):
     group = get_object_or_404(Group, slug=slug)
-    posts = group.posts.all()[:12]
+    posts = group.posts.for_feed()
 
-    paginator = Paginator(posts, 10)
-    page_number = request.GET.get("page")
-    page = paginator.get_page(page_number)
+    paginator = CursorPaginator(posts, 10, total=group.posts_count)
+    page = paginator.get_cursor_page(request.GET)
 
-    return render(
+    response = render(
         request,
         "posts/group.html",
         {
             "group": group,
-            "posts": posts,
             "page": page,
         },
     )
+    # Шапка с числом записей устаревает и на курсорных страницах ?after=.
+    response.cache_tags = feed_tags(request, page, list_tag=None) + [
+        group_tag(group.pk),
+        group_feed_tag(group.pk),
+    ]
+    return response
 
 
 @require_GET
+def search(request):
+    form = SearchForm(request.GET or None)
+    page = None
+    if form.is_valid():
+        expression = fts.match_expression(form.cleaned_data["q"])
+        if expression is not None:
+            paginator = SearchPaginator(
+                Post.objects.for_feed(), 10, expression, form.filters()
+            )
+            page = paginator.get_cursor_page(request.GET)
+
+    # Ссылки пагинатора сохраняют сам запрос и фильтры.
+    page_query = request.GET.copy()
+    for param in ("page", "after", "before"):
+        page_query.pop(param, None)
+
+    return render(
+        request,
+        "posts/search.html",
+        {"form": form, "page": page, "page_query": page_query.urlencode()},
+    )
+
+
+@require_GET
+@conditional_page(_profile_versions)
+@cache_feed_page("profile_page")
 def profile(request, username):
-    author = get_object_or_404(User, username=username)
-    posts_all = Post.objects.filter(author_id=author.id)
+    author = get_object_or_404(
+        User.objects.select_related("stats"), username=username
+    )
+    posts = Post.objects.for_feed().filter(author_id=author.id)
 
-    paginator = Paginator(posts_all, 10)
-    page_number = request.GET.get("page")
-    page = paginator.get_page(page_number)
+    paginator = CursorPaginator(posts, 10, total=_stats(author).posts_count)
+    page = paginator.get_cursor_page(request.GET)
 
     following = False
     if request.user.is_authenticated:
@@ -59,38 +168,77 @@ def profile(request, username):
             user=request.user, author=author
         ).exists()
 
-    return render(
+    response = render(
         request,
         "posts/profile.html",
         {
-            "posts_all": posts_all,
             "author": author,
             "page": page,
             "following": following,
         },
     )
+    # Счётчики и кнопка подписки устаревают и на курсорных страницах.
+    response.cache_tags = feed_tags(request, page, list_tag=None) + [
+        author_tag(author.pk)
+    ]
+    return response
 
 
 @require_GET
+@conditional_page(_post_versions)
+@cache_feed_page("post_page")
 def post_view(request, username, post_id):
-    author = get_object_or_404(User, username=username)
-    post = get_object_or_404(Post, author=author, id=post_id)
-    posts_count = Post.objects.filter(author_id=author.id)
+    post = get_object_or_404(
+        Post.objects.select_related("author__stats"),
+        author__username=username,
+        id=post_id,
+    )
+    _stats(post.author)
 
-    comments = post.comments.all()
+    paginator = CommentPaginator(
+        post.comments.select_related("author"), COMMENTS_PER_PAGE
+    )
+    comments = paginator.get_cursor_page(request.GET)
     form = CommentForm()
 
-    return render(
+    response = render(
         request,
         "posts/post.html",
         {
-            "author": author,
-            "posts_count": posts_count,
+            "author": post.author,
             "post": post,
             "comments": comments,
             "form": form,
         },
     )
+    # CSRF-токен форма комментария получает отдельным запросом, так что
+    # страница одна для всех, кто видит эту версию записи.
+    response.cache_tags = [
+        post_tag(post.pk),
+        comments_tag(post.pk),
+        author_tag(post.author_id),
+    ]
+    return response
+
+
+@require_GET
+@cache_feed_page("comments_page")
+def post_comments(request, username, post_id):
+    """Следующая порция комментариев фрагментом HTML для «Показать ещё»."""
+    comments = Comment.objects.filter(
+        post_id=post_id, post__author__username=username
+    ).select_related("author")
+
+    paginator = CommentPaginator(comments, COMMENTS_PER_PAGE)
+    page = paginator.get_cursor_page(request.GET)
+
+    response = render(
+        request,
+        "posts/comment_list.html",
+        {"comments": page, "username": username, "post_id": post_id},
+    )
+    response.cache_tags = [comments_tag(post_id)]
+    return response
 
 
 @login_required
@@ -105,6 +253,7 @@ def new_post(request):
     post = form.save(commit=False)
     post.author = request.user
     post.save()
+    thumbnails.enqueue(post)
     return redirect("index")
 
 
@@ -119,7 +268,10 @@ def post_edit(request, username, post_id):
         return redirect("post", username, post_id)
 
     if form.is_valid():
+        if "image" in form.changed_data:
+            post_edit.thumbnail = ""
         form.save()
+        thumbnails.enqueue(post_edit)
         return redirect("post", username, post_id)
 
     return render(
@@ -138,17 +290,25 @@ def add_comment(request, username, post_id):
         comment = form.save(commit=False)
         comment.author = request.user
         comment.post = post
-        comment.save()
+        with transaction.atomic():
+            comment.save()
     return redirect("post", username=author.username, post_id=post_id)
 
 
 @login_required
 def follow_index(request):
-    posts = Post.objects.filter(author__following__user=request.user)
-
-    paginator = Paginator(posts, 10)
-    page_number = request.GET.get("page")
-    page = paginator.get_page(page_number)
+    pulled = timeline.pulled_authors(request.user)
+
+    paginator = TimelinePaginator(
+        Post.objects.for_feed(),
+        10,
+        entries=TimelineEntry.objects.filter(user=request.user),
+        pulled=[
+            Post.objects.for_feed().filter(author_id=author_id)
+            for author_id in pulled
+        ],
+    )
+    page = paginator.get_cursor_page(request.GET)
 
     return render(request, "posts/follow.html", {"page": page})
 
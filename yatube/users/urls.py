@@ -2,4 +2,7 @@ from django.urls import path
 
 from . import views
 
-urlpatterns = [path("signup/", views.SignUp.as_view(), name="signup")]
+urlpatterns = [
+    path("signup/", views.SignUp.as_view(), name="signup"),
+    path("csrf/", views.csrf_token, name="csrf_token"),
+]
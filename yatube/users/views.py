@@ -1,4 +1,8 @@
+from django.http import JsonResponse
+from django.middleware.csrf import get_token
 from django.urls import reverse_lazy
+from django.views.decorators.cache import never_cache
+from django.views.decorators.http import require_GET
 from django.views.generic import CreateView
 
 from .forms import CreationForm
@@ -8,3 +12,10 @@ class SignUp(CreateView):
     form_class = CreationForm
     success_url = reverse_lazy("signup")
     template_name = "signup.html"
+
+
+@never_cache
+@require_GET
+def csrf_token(request):
+    """CSRF-токен для форм на страницах, которые кешируются целиком."""
+    return JsonResponse({"token": get_token(request)})
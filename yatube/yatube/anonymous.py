@@ -0,0 +1,71 @@
+"""Быстрый путь для анонимных читателей.
+
+GET без cookie сессии и сообщений к представлению из ``ANONYMOUS_VIEWS``
+заведомо приходит от анонима, поэтому ``AnonymousFastPathMiddleware``
+вызывает представление сразу, минуя сессии, CSRF, аутентификацию и
+сообщения. Страница такому запросу нужна та же, что и любому другому
+анониму: её отдаёт общий кеш страниц (``posts.caching.cache_feed_page``).
+При ``ANONYMOUS_FAST_PATH = False`` middleware выгружается при старте, и
+все запросы идут через полный стек.
+
+Представления из ``ANONYMOUS_VIEWS`` не должны обращаться к
+``request.session`` и не должны выводить анониму CSRF-токен или
+сообщения.
+"""
+
+from django.conf import settings
+from django.contrib.auth.models import AnonymousUser
+from django.contrib.messages.storage.cookie import CookieStorage
+from django.core.exceptions import MiddlewareNotUsed
+from django.core.handlers.exception import convert_exception_to_response
+from django.middleware.clickjacking import XFrameOptionsMiddleware
+from django.urls import Resolver404, resolve
+from django.utils.cache import patch_vary_headers
+
+
+class AnonymousFastPathMiddleware:
+    def __init__(self, get_response):
+        if not settings.ANONYMOUS_FAST_PATH:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.views = frozenset(settings.ANONYMOUS_VIEWS)
+        # С такими cookie запрос может оказаться от пользователя или
+        # унести с собой сообщения — ему нужен полный стек.
+        self.cookies = (
+            settings.SESSION_COOKIE_NAME,
+            CookieStorage.cookie_name,
+        )
+        self.xframe = XFrameOptionsMiddleware()
+        self.fast_response = convert_exception_to_response(self._call_view)
+
+    def _match(self, request):
+        if request.method != "GET":
+            return None
+        if any(name in request.COOKIES for name in self.cookies):
+            return None
+        try:
+            match = resolve(
+                request.path_info, getattr(request, "urlconf", None)
+            )
+        except Resolver404:
+            return None
+        return match if match.view_name in self.views else None
+
+    def _call_view(self, request):
+        callback, args, kwargs = request.resolver_match
+        response = callback(request, *args, **kwargs)
+        if callable(getattr(response, "render", None)):
+            response = response.render()
+        return response
+
+    def __call__(self, request):
+        match = self._match(request)
+        if match is None:
+            return self.get_response(request)
+        request.resolver_match = match
+        request.user = AnonymousUser()
+        response = self.fast_response(request)
+        # Пользователь со своей сессией должен получить свою страницу, а
+        # не эту из промежуточного кеша: все запросы без cookie делят её.
+        patch_vary_headers(response, ("Cookie",))
+        return self.xframe.process_response(request, response)
@@ -49,7 +49,9 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    "yatube.timing.ServerTimingMiddleware",
     "django.middleware.security.SecurityMiddleware",
+    "yatube.anonymous.AnonymousFastPathMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
     "django.middleware.common.CommonMiddleware",
     "django.middleware.csrf.CsrfViewMiddleware",
@@ -140,8 +142,78 @@ LOGIN_REDIRECT_URL = "index"
 EMAIL_BACKEND = "django.core.mail.backends.filebased.EmailBackend"
 EMAIL_FILE_PATH = os.path.join(BASE_DIR, "sent_emails")
 
+# Посты авторов с большим числом подписчиков не раскладываются по
+# таймлайнам при публикации, а подмешиваются в ленту при чтении. Обратно
+# на раскладку автор переходит, когда подписчиков становится не больше
+# FANOUT_RESUME_FOLLOWERS.
+FANOUT_FOLLOWERS_LIMIT = 1000
+FANOUT_RESUME_FOLLOWERS = 800
+# Сколько последних записей автора попадает в таймлайн при подписке на
+# него; более старые остаются в его профиле.
+TIMELINE_BACKFILL_POSTS = 200
+
+# Сколько секунд число записей для ссылки на последнюю страницу ленты
+# может отставать от таблицы.
+PAGINATOR_COUNT_TIMEOUT = 60
+
+# Потоки, в которых генерируются миниатюры загруженных картинок;
+# 0 — генерировать сразу после коммита в потоке запроса.
+THUMBNAIL_WORKERS = 2
+
+# Устаревшую страницу ленты аноним получает сразу, а обновляется она в
+# фоне, если устаревшей её застали не раньше FEED_STALE_WHILE_REVALIDATE
+# секунд назад. При ошибке базы отдаётся страница не старше
+# FEED_STALE_IF_ERROR.
+FEED_STALE_WHILE_REVALIDATE = 60
+FEED_STALE_IF_ERROR = 60 * 60 * 24
+# Потоки фонового обновления страниц; 0 — обновлять сразу в запросе.
+FEED_REFRESH_WORKERS = 2
+
+# Кеш общий для всех воркеров на хосте: SQLite-файл в режиме WAL.
 CACHES = {
     "default": {
-        "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+        "BACKEND": "yatube.sqlite_cache.SQLiteCache",
+        "LOCATION": os.path.join(BASE_DIR, "cache.sqlite3"),
+        "OPTIONS": {
+            "MAX_SIZE": 256 * 1024 * 1024,
+            "COMPRESS_MIN_SIZE": 1024,
+        },
     }
 }
+# Тесты работают с кешем во временном файле, а не с общим.
+TEST_RUNNER = "yatube.test_runner.ScratchCacheRunner"
+
+# Перед общим кешем у каждого воркера свой в памяти для страниц: они
+# сверяются с версиями тегов при каждом чтении, а держатся не дольше
+# LOCAL_CACHE_TIMEOUT секунд и не больше LOCAL_CACHE_MAX_SIZE байт.
+LOCAL_CACHE_MAX_SIZE = 32 * 1024 * 1024
+LOCAL_CACHE_TIMEOUT = 30
+
+# Заголовок Server-Timing со временем SQL, кеша и шаблонов; при False
+# middleware не подключается совсем. SERVER_TIMING_LOG добавляет строку
+# JSON на каждый запрос в лог yatube.timing.
+SERVER_TIMING = True
+SERVER_TIMING_LOG = False
+
+# GET без cookie сессии и сообщений к этим страницам обрабатывается в
+# обход сессий, CSRF, аутентификации и сообщений; при False все запросы
+# идут через полный стек middleware.
+ANONYMOUS_FAST_PATH = True
+ANONYMOUS_VIEWS = (
+    "index",
+    "group_posts",
+    "profile",
+    "post",
+    "post_comments",
+    "search",
+    "about:author",
+    "about:tech",
+)
+
+# Заменитель обратного прокси для разработки (yatube.surrogate): хранит
+# страницы анонимов с заголовком Surrogate-Key, пока их теги не сброшены.
+SURROGATE_CACHE = False
+# Настоящим прокси после коммита уходит PURGE с заголовком Surrogate-Key
+# сброшенных тегов.
+SURROGATE_PURGE_URLS = []
+SURROGATE_PURGE_TIMEOUT = 2
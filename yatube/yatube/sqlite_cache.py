@@ -0,0 +1,318 @@
+"""Кеш в файле SQLite, общий для всех процессов-воркеров на хосте.
+
+Файл открывается в режиме WAL: читатели не блокируют друг друга и
+писателя, а запись идёт под одной блокировкой ``BEGIN IMMEDIATE``.
+Размер кеша ограничен ``OPTIONS["MAX_SIZE"]`` байтами, при превышении
+вытесняются давно не читавшиеся ключи. Значения не меньше
+``OPTIONS["COMPRESS_MIN_SIZE"]`` байт хранятся сжатыми zlib.
+"""
+
+import os
+import pickle
+import sqlite3
+import time
+import zlib
+
+from django.core.cache.backends.base import DEFAULT_TIMEOUT, BaseCache
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS cache (
+    key TEXT PRIMARY KEY,
+    value BLOB NOT NULL,
+    size INTEGER NOT NULL,
+    expires REAL,
+    accessed REAL NOT NULL
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS cache_accessed ON cache (accessed);
+CREATE INDEX IF NOT EXISTS cache_expires ON cache (expires);
+CREATE TABLE IF NOT EXISTS cache_size (
+    id INTEGER PRIMARY KEY CHECK (id = 0),
+    total INTEGER NOT NULL
+);
+INSERT OR IGNORE INTO cache_size VALUES (0, 0);
+CREATE TRIGGER IF NOT EXISTS cache_insert AFTER INSERT ON cache BEGIN
+    UPDATE cache_size SET total = total + NEW.size;
+END;
+CREATE TRIGGER IF NOT EXISTS cache_delete AFTER DELETE ON cache BEGIN
+    UPDATE cache_size SET total = total - OLD.size;
+END;
+CREATE TRIGGER IF NOT EXISTS cache_update AFTER UPDATE OF size ON cache
+BEGIN
+    UPDATE cache_size SET total = total - OLD.size + NEW.size;
+END;
+"""
+
+UPSERT = """
+INSERT INTO cache (key, value, size, expires, accessed)
+VALUES (?, ?, ?, ?, ?)
+ON CONFLICT (key) DO UPDATE SET
+    value = excluded.value,
+    size = excluded.size,
+    expires = excluded.expires,
+    accessed = excluded.accessed
+"""
+
+# Сколько секунд запись ждёт блокировки, занятой другим процессом.
+BUSY_TIMEOUT = 5
+# Время последнего чтения обновляется не чаще раза в секунду на ключ,
+# чтобы частые чтения не превращались в записи.
+ACCESS_RESOLUTION = 1.0
+# При переполнении кеш ужимается до этой доли MAX_SIZE.
+CULL_TO = 0.9
+# Сжатое значение хранится, только если оно не длиннее этой доли
+# исходного: уже сжатое (например, страницы в gzip) не сжимается дважды.
+COMPRESS_RATIO = 0.9
+# Значение pickle.HIGHEST_PROTOCOL начинается с опкода PROTO, а сжатое
+# zlib — с другого байта.
+PICKLE_PREFIX = b"\x80"
+
+
+def _loads(blob):
+    if not blob.startswith(PICKLE_PREFIX):
+        blob = zlib.decompress(blob)
+    return pickle.loads(blob)
+
+
+class SQLiteCache(BaseCache):
+    def __init__(self, location, params):
+        super().__init__(params)
+        options = params.get("OPTIONS", {})
+        self._path = location
+        self._max_size = int(options.get("MAX_SIZE", 64 * 1024 * 1024))
+        # None — не сжимать.
+        self._compress_min_size = options.get("COMPRESS_MIN_SIZE")
+        self._connection = None
+        self._pid = None
+
+    @property
+    def _db(self):
+        # Соединение нельзя наследовать через fork: каждый воркер
+        # открывает своё.
+        if self._connection is None or self._pid != os.getpid():
+            self._connection = self._connect()
+            self._pid = os.getpid()
+        return self._connection
+
+    def _connect(self):
+        connection = sqlite3.connect(
+            self._path, timeout=BUSY_TIMEOUT, isolation_level=None
+        )
+        connection.execute("PRAGMA journal_mode = WAL")
+        connection.execute("PRAGMA synchronous = NORMAL")
+        connection.execute(f"PRAGMA mmap_size = {self._max_size * 2}")
+        # Все операторы схемы идемпотентны, поэтому воркеры, стартующие
+        # одновременно, могут выполнять её параллельно.
+        connection.executescript(SCHEMA)
+        return connection
+
+    def _dumps(self, value):
+        blob = pickle.dumps(value, pickle.HIGHEST_PROTOCOL)
+        if (
+            self._compress_min_size is not None
+            and len(blob) >= self._compress_min_size
+        ):
+            packed = zlib.compress(blob)
+            if len(packed) <= len(blob) * COMPRESS_RATIO:
+                return packed
+        return blob
+
+    def _write(self):
+        return _Transaction(self._db)
+
+    def _expires(self, timeout):
+        return self.get_backend_timeout(timeout)
+
+    def _cull(self, db):
+        target = self._max_size * CULL_TO
+        (total,) = db.execute("SELECT total FROM cache_size").fetchone()
+        if total <= self._max_size:
+            return
+        db.execute("DELETE FROM cache WHERE expires <= ?", (time.time(),))
+        (total,) = db.execute("SELECT total FROM cache_size").fetchone()
+        victims = []
+        for key, size in db.execute(
+            "SELECT key, size FROM cache ORDER BY accessed"
+        ):
+            if total <= target:
+                break
+            victims.append((key,))
+            total -= size
+        db.executemany("DELETE FROM cache WHERE key = ?", victims)
+
+    def _rows(self, keys):
+        placeholders = ", ".join("?" * len(keys))
+        now = time.time()
+        rows = self._db.execute(
+            f"SELECT key, value, accessed FROM cache "
+            f"WHERE key IN ({placeholders}) "
+            f"AND (expires IS NULL OR expires > ?)",
+            (*keys, now),
+        ).fetchall()
+        stale = [
+            key
+            for key, _, accessed in rows
+            if accessed < now - ACCESS_RESOLUTION
+        ]
+        if stale:
+            self._mark_read(stale, now)
+        return {key: _loads(value) for key, value, _ in rows}
+
+    def _mark_read(self, keys, now):
+        """Отметить чтение ``keys``, если блокировка записи свободна.
+
+        Время чтения нужно только для выбора вытесняемых ключей, поэтому
+        чтение не ждёт чужой записи: отметка тогда просто пропускается.
+        """
+        db = self._db
+        db.execute("PRAGMA busy_timeout = 0")
+        try:
+            with self._write():
+                db.executemany(
+                    "UPDATE cache SET accessed = ? WHERE key = ?",
+                    [(now, key) for key in keys],
+                )
+        except sqlite3.OperationalError:
+            pass
+        finally:
+            db.execute(f"PRAGMA busy_timeout = {BUSY_TIMEOUT * 1000}")
+
+    def _store(self, db, items, timeout):
+        expires = self._expires(timeout)
+        now = time.time()
+        rows = []
+        for key, value in items:
+            blob = self._dumps(value)
+            rows.append((key, blob, len(key) + len(blob), expires, now))
+        db.executemany(UPSERT, rows)
+        self._cull(db)
+
+    def add(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self.make_key(key, version=version)
+        self.validate_key(key)
+        blob = self._dumps(value)
+        now = time.time()
+        with self._write() as db:
+            added = db.execute(
+                UPSERT + " WHERE cache.expires <= ?",
+                (
+                    key,
+                    blob,
+                    len(key) + len(blob),
+                    self._expires(timeout),
+                    now,
+                    now,
+                ),
+            ).rowcount
+            self._cull(db)
+        return bool(added)
+
+    def get(self, key, default=None, version=None):
+        key = self.make_key(key, version=version)
+        self.validate_key(key)
+        return self._rows([key]).get(key, default)
+
+    def set(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self.make_key(key, version=version)
+        self.validate_key(key)
+        with self._write() as db:
+            self._store(db, [(key, value)], timeout)
+
+    def touch(self, key, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self.make_key(key, version=version)
+        self.validate_key(key)
+        with self._write() as db:
+            return bool(
+                db.execute(
+                    "UPDATE cache SET expires = ? WHERE key = ? "
+                    "AND (expires IS NULL OR expires > ?)",
+                    (self._expires(timeout), key, time.time()),
+                ).rowcount
+            )
+
+    def delete(self, key, version=None):
+        key = self.make_key(key, version=version)
+        self.validate_key(key)
+        with self._write() as db:
+            db.execute("DELETE FROM cache WHERE key = ?", (key,))
+
+    def get_many(self, keys, version=None):
+        """Все ключи читаются одним запросом, то есть одним снимком WAL."""
+        made = {self.make_key(key, version=version): key for key in keys}
+        for key in made:
+            self.validate_key(key)
+        if not made:
+            return {}
+        found = self._rows(list(made))
+        return {made[key]: value for key, value in found.items()}
+
+    def set_many(self, data, timeout=DEFAULT_TIMEOUT, version=None):
+        """Все ключи записываются в одной транзакции."""
+        items = []
+        for key, value in data.items():
+            key = self.make_key(key, version=version)
+            self.validate_key(key)
+            items.append((key, value))
+        with self._write() as db:
+            self._store(db, items, timeout)
+        return []
+
+    def delete_many(self, keys, version=None):
+        keys = [self.make_key(key, version=version) for key in keys]
+        with self._write() as db:
+            db.executemany(
+                "DELETE FROM cache WHERE key = ?", [(key,) for key in keys]
+            )
+
+    def has_key(self, key, version=None):
+        key = self.make_key(key, version=version)
+        self.validate_key(key)
+        return (
+            self._db.execute(
+                "SELECT 1 FROM cache WHERE key = ? "
+                "AND (expires IS NULL OR expires > ?)",
+                (key, time.time()),
+            ).fetchone()
+            is not None
+        )
+
+    def incr(self, key, delta=1, version=None):
+        """Атомарно: чтение и запись идут под одной блокировкой записи."""
+        key = self.make_key(key, version=version)
+        self.validate_key(key)
+        with self._write() as db:
+            row = db.execute(
+                "SELECT value FROM cache WHERE key = ? "
+                "AND (expires IS NULL OR expires > ?)",
+                (key, time.time()),
+            ).fetchone()
+            if row is None:
+                raise ValueError(f"Key '{key}' not found")
+            value = _loads(row[0]) + delta
+            blob = self._dumps(value)
+            db.execute(
+                "UPDATE cache SET value = ?, size = ? WHERE key = ?",
+                (blob, len(key) + len(blob), key),
+            )
+        return value
+
+    def clear(self):
+        with self._write() as db:
+            db.execute("DELETE FROM cache")
+
+    def close(self, **kwargs):
+        # Соединение живёт всё время работы процесса, как и сам файл.
+        pass
+
+
+class _Transaction:
+    """``BEGIN IMMEDIATE`` сразу берёт блокировку записи файла."""
+
+    def __init__(self, db):
+        self.db = db
+
+    def __enter__(self):
+        self.db.execute("BEGIN IMMEDIATE")
+        return self.db
+
+    def __exit__(self, exc_type, exc, traceback):
+        self.db.execute("ROLLBACK" if exc_type else "COMMIT")
@@ -0,0 +1,103 @@
+"""Заменитель обратного прокси с кешем по тегам (Surrogate-Key).
+
+``SurrogateKeyCache`` оборачивает WSGI-приложение так же, как его
+оборачивал бы Varnish или CDN: хранит ответы на GET без cookie с
+заголовком ``Surrogate-Key`` и отдаёт их, не обращаясь к приложению,
+пока один из тегов ответа не сброшен. Сброс приходит сигналом
+``posts.caching.tags_purged`` из того же процесса или запросом ``PURGE``
+с заголовком ``Surrogate-Key``. Кеш живёт в памяти процесса — это
+инструмент для разработки и тестов, включается ``SURROGATE_CACHE``.
+
+Как и настоящий прокси по ``Vary: Accept-Encoding``, сжатые и несжатые
+ответы хранятся отдельно.
+"""
+
+import collections
+import re
+import threading
+
+from posts import caching
+
+ACCEPTS_GZIP = re.compile(r"\bgzip\b")
+
+
+class SurrogateKeyCache:
+    def __init__(self, application):
+        self.application = application
+        self._entries = {}
+        self._tags = {}
+        self._keys = collections.defaultdict(set)
+        self._lock = threading.Lock()
+        # Растёт с каждым сбросом: ответ, отрисованный до сброса, не
+        # сохраняется после него.
+        self._purges = 0
+        caching.tags_purged.connect(self._purged, weak=False)
+
+    def _purged(self, sender, tags, **kwargs):
+        self.purge(tags)
+
+    def purge(self, tags):
+        """Забыть ответы с любым из ``tags``; возвращает их число."""
+        with self._lock:
+            self._purges += 1
+            keys = set().union(*(self._keys.pop(tag, ()) for tag in tags))
+            for key in keys:
+                self._entries.pop(key, None)
+                for tag in self._tags.pop(key, ()):
+                    self._keys[tag].discard(key)
+        return len(keys)
+
+    def _store(self, key, status, headers, body, purges):
+        named = {name.lower(): value for name, value in headers}
+        tags = named.get("surrogate-key", "").split()
+        if (
+            not status.startswith("200 ")
+            or not tags
+            or "set-cookie" in named
+            or "private" in named.get("cache-control", "")
+            or named.get("x-cache") == "STALE"
+        ):
+            return
+        with self._lock:
+            if purges != self._purges:
+                return
+            self._entries[key] = (status, headers, body)
+            self._tags[key] = tags
+            for tag in tags:
+                self._keys[tag].add(key)
+
+    def __call__(self, environ, start_response):
+        method = environ["REQUEST_METHOD"]
+        if method == "PURGE":
+            count = self.purge(environ.get("HTTP_SURROGATE_KEY", "").split())
+            start_response("200 OK", [("Content-Type", "text/plain")])
+            return [f"{count}\n".encode()]
+        if method != "GET" or environ.get("HTTP_COOKIE"):
+            return self.application(environ, start_response)
+
+        url = environ.get("PATH_INFO", "/")
+        if environ.get("QUERY_STRING"):
+            url = f"{url}?{environ['QUERY_STRING']}"
+        encoding = environ.get("HTTP_ACCEPT_ENCODING", "")
+        key = (url, bool(ACCEPTS_GZIP.search(encoding)))
+        entry = self._entries.get(key)
+        if entry is not None:
+            status, headers, body = entry
+            start_response(status, headers + [("X-Proxy-Cache", "HIT")])
+            return [body]
+
+        purges = self._purges
+        response = {}
+
+        def capture(status, headers, exc_info=None):
+            response.update(status=status, headers=headers)
+            return start_response(status, headers, exc_info)
+
+        result = self.application(environ, capture)
+        try:
+            body = b"".join(result)
+        finally:
+            if hasattr(result, "close"):
+                result.close()
+        self._store(key, response["status"], response["headers"], body, purges)
+        return [body]
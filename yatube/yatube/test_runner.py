@@ -0,0 +1,33 @@
+"""Запуск тестов с кешем во временном файле.
+
+Тесты чистят кеш, а рабочий кеш в ``BASE_DIR/cache.sqlite3`` общий для
+всех воркеров на хосте: без подмены прогон тестов опустошал бы его.
+"""
+
+import os
+import shutil
+import tempfile
+
+from django.conf import settings
+from django.test.runner import DiscoverRunner
+from django.test.utils import override_settings
+
+
+class ScratchCacheRunner(DiscoverRunner):
+    def setup_test_environment(self, **kwargs):
+        super().setup_test_environment(**kwargs)
+        self._cache_dir = tempfile.mkdtemp()
+        self._caches = override_settings(
+            CACHES={
+                "default": {
+                    **settings.CACHES["default"],
+                    "LOCATION": os.path.join(self._cache_dir, "cache.sqlite3"),
+                }
+            }
+        )
+        self._caches.enable()
+
+    def teardown_test_environment(self, **kwargs):
+        self._caches.disable()
+        shutil.rmtree(self._cache_dir, ignore_errors=True)
+        super().teardown_test_environment(**kwargs)
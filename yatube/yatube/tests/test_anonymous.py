@@ -0,0 +1,89 @@
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.contrib.auth.middleware import AuthenticationMiddleware
+from django.contrib.messages.middleware import MessageMiddleware
+from django.contrib.sessions.middleware import SessionMiddleware
+from django.core.cache import cache
+from django.core.exceptions import MiddlewareNotUsed
+from django.middleware.csrf import CsrfViewMiddleware
+from django.test import Client, TestCase, override_settings
+
+from posts.models import Post
+
+from ..anonymous import AnonymousFastPathMiddleware
+
+User = get_user_model()
+
+SKIPPED = (
+    (SessionMiddleware, "process_request"),
+    (CsrfViewMiddleware, "process_view"),
+    (AuthenticationMiddleware, "process_request"),
+    (MessageMiddleware, "process_request"),
+)
+
+
+@override_settings(ANONYMOUS_FAST_PATH=True, FEED_REFRESH_WORKERS=0)
+class AnonymousFastPathTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.author = User.objects.create(username="Pasha")
+        self.post = Post.objects.create(
+            text="Первая запись", author=self.author
+        )
+
+    def patch_skipped(self):
+        mocks = []
+        for cls, name in SKIPPED:
+            patcher = mock.patch.object(
+                cls, name, autospec=True, side_effect=getattr(cls, name)
+            )
+            mocks.append(patcher.start())
+            self.addCleanup(patcher.stop)
+        return mocks
+
+    def test_cookieless_get_skips_middleware(self):
+        mocks = self.patch_skipped()
+        for url in (
+            "/",
+            "/Pasha/",
+            f"/Pasha/{self.post.pk}/",
+            "/search/?q=запись",
+            "/about/tech/",
+        ):
+            with self.subTest(url=url):
+                response = Client().get(url)
+                self.assertEqual(response.status_code, 200)
+                self.assertFalse(response.cookies)
+                self.assertIn("Cookie", response["Vary"])
+                self.assertEqual(response["X-Frame-Options"], "SAMEORIGIN")
+        for skipped in mocks:
+            self.assertFalse(skipped.called)
+
+    def test_pages_are_shared_by_anonymous_readers(self):
+        url = f"/Pasha/{self.post.pk}/"
+        Client().get(url)
+        # Остаётся только сверка версии записи для условного GET.
+        with self.assertNumQueries(1):
+            response = Client().get(url)
+        self.assertContains(response, "Первая запись")
+
+    def test_missing_page(self):
+        response = Client().get("/group/missing/")
+        self.assertTemplateUsed(response, "misc/404.html")
+
+    def test_full_stack_for_sessions_and_other_views(self):
+        mocks = self.patch_skipped()
+        client = Client()
+        client.force_login(self.author)
+        response = client.get("/")
+        self.assertContains(response, "Пользователь: Pasha")
+        Client().get("/new/")
+        Client().post("/", {})
+        for skipped in mocks:
+            self.assertEqual(skipped.call_count, 3)
+
+    def test_disabled(self):
+        with override_settings(ANONYMOUS_FAST_PATH=False):
+            with self.assertRaises(MiddlewareNotUsed):
+                AnonymousFastPathMiddleware(lambda request: None)
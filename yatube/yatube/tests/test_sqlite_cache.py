@@ -0,0 +1,132 @@
+import multiprocessing
+import os
+import shutil
+import sqlite3
+import tempfile
+import time
+
+from django.test import SimpleTestCase
+
+from ..sqlite_cache import SQLiteCache
+
+
+def make_cache(path, **options):
+    return SQLiteCache(path, {"OPTIONS": options})
+
+
+def incr_many(path, times):
+    cache = make_cache(path)
+    for _ in range(times):
+        cache.incr("counter")
+
+
+class SQLiteCacheTest(SimpleTestCase):
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.path = os.path.join(self.dir, "cache.sqlite3")
+        self.cache = make_cache(self.path)
+
+    def tearDown(self):
+        shutil.rmtree(self.dir, ignore_errors=True)
+
+    def test_values_are_shared_between_instances(self):
+        """Второй экземпляр (другой воркер) видит записи первого."""
+        self.cache.set("key", {"a": 1})
+        self.assertEqual(make_cache(self.path).get("key"), {"a": 1})
+
+    def test_timeout(self):
+        self.cache.set("key", "value", timeout=0.1)
+        self.cache.set("forever", "value", timeout=None)
+        time.sleep(0.2)
+        self.assertIsNone(self.cache.get("key"))
+        self.assertEqual(self.cache.get("forever"), "value")
+
+    def test_add_only_sets_missing_or_expired_keys(self):
+        self.assertTrue(self.cache.add("key", 1))
+        self.assertFalse(self.cache.add("key", 2))
+        self.assertEqual(self.cache.get("key"), 1)
+        self.cache.set("short", 1, timeout=0.1)
+        time.sleep(0.2)
+        self.assertTrue(self.cache.add("short", 2))
+        self.assertEqual(self.cache.get("short"), 2)
+
+    def test_get_many_and_set_many(self):
+        self.cache.set_many({"a": 1, "b": 2})
+        self.assertEqual(
+            self.cache.get_many(["a", "b", "c"]), {"a": 1, "b": 2}
+        )
+        self.cache.delete_many(["a"])
+        self.assertEqual(self.cache.get_many(["a", "b"]), {"b": 2})
+
+    def test_incr_is_atomic_across_processes(self):
+        self.cache.set("counter", 0)
+        workers = [
+            multiprocessing.Process(target=incr_many, args=(self.path, 100))
+            for _ in range(4)
+        ]
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+        self.assertEqual(self.cache.get("counter"), 400)
+
+    def test_incr_missing_key(self):
+        with self.assertRaises(ValueError):
+            self.cache.incr("missing")
+
+    def test_least_recently_used_keys_are_evicted(self):
+        cache = make_cache(self.path, MAX_SIZE=20 * 1024)
+        cache.set("hot", "x" * 1024)
+        for i in range(40):
+            cache.set(f"cold{i}", "x" * 1024)
+            # Чтение «горячего» ключа отодвигает его от вытеснения.
+            cache._db.execute(
+                "UPDATE cache SET accessed = ? WHERE key = ?",
+                (time.time() + 1, cache.make_key("hot")),
+            )
+        self.assertIsNotNone(cache.get("hot"))
+        self.assertIsNone(cache.get("cold0"))
+        (total,) = cache._db.execute("SELECT total FROM cache_size").fetchone()
+        self.assertLessEqual(total, 20 * 1024)
+
+    def test_read_does_not_wait_for_write_lock(self):
+        self.cache.set("key", "value")
+        self.cache._db.execute("UPDATE cache SET accessed = 0")
+        writer = sqlite3.connect(self.path, isolation_level=None)
+        writer.execute("BEGIN IMMEDIATE")
+        try:
+            started = time.monotonic()
+            self.assertEqual(self.cache.get("key"), "value")
+            self.assertLess(time.monotonic() - started, 1)
+        finally:
+            writer.execute("ROLLBACK")
+            writer.close()
+        # Запись по-прежнему ждёт блокировку, а не падает сразу.
+        (timeout,) = self.cache._db.execute("PRAGMA busy_timeout").fetchone()
+        self.assertEqual(timeout, 5000)
+        self.assertEqual(self.cache.get("key"), "value")
+        (accessed,) = self.cache._db.execute(
+            "SELECT accessed FROM cache"
+        ).fetchone()
+        self.assertGreater(accessed, 0)
+
+    def test_large_values_are_compressed(self):
+        cache = make_cache(self.path, COMPRESS_MIN_SIZE=1024)
+        cache.set("small", "x" * 100)
+        cache.set("large", "x" * 10000)
+        cache.set("random", os.urandom(10000))
+        sizes = dict(cache._db.execute("SELECT key, size FROM cache"))
+        self.assertLess(sizes[cache.make_key("small")], 200)
+        self.assertLess(sizes[cache.make_key("large")], 1000)
+        # Несжимаемое хранится как есть.
+        self.assertGreater(sizes[cache.make_key("random")], 10000)
+        self.assertEqual(
+            make_cache(self.path).get_many(["small", "large"]),
+            {"small": "x" * 100, "large": "x" * 10000},
+        )
+
+    def test_clear(self):
+        self.cache.set("key", 1)
+        self.cache.clear()
+        self.assertIsNone(self.cache.get("key"))
+        self.assertFalse(self.cache.has_key("key"))
@@ -0,0 +1,80 @@
+import gzip
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.handlers.wsgi import WSGIHandler
+from django.core.signals import request_finished, request_started
+from django.db import close_old_connections
+from django.test import RequestFactory, TestCase, override_settings
+
+from posts import caching
+from posts.models import Post
+
+from ..surrogate import SurrogateKeyCache
+
+User = get_user_model()
+
+
+@override_settings(FEED_REFRESH_WORKERS=0)
+class SurrogateKeyCacheTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        # Как и тестовый клиент, не закрываем соединение теста между
+        # запросами.
+        for signal in (request_started, request_finished):
+            signal.disconnect(close_old_connections)
+            self.addCleanup(signal.connect, close_old_connections)
+        self.proxy = SurrogateKeyCache(WSGIHandler())
+        self.addCleanup(caching.tags_purged.disconnect, self.proxy._purged)
+        self.author = User.objects.create(username="Pasha")
+        self.post = Post.objects.create(text="Запись", author=self.author)
+        self.url = f"/Pasha/{self.post.pk}/"
+
+    def request(self, method="GET", url=None, **headers):
+        environ = RequestFactory().generic(method, url or self.url).environ
+        environ.update(headers)
+        response = {}
+
+        def start_response(status, headers, exc_info=None):
+            response.update(status=status, headers=dict(headers))
+
+        response["body"] = b"".join(self.proxy(environ, start_response))
+        return response
+
+    def test_page_is_kept_until_purged(self):
+        self.assertNotIn("X-Proxy-Cache", self.request()["headers"])
+        with self.assertNumQueries(0):
+            response = self.request()
+        self.assertEqual(response["headers"]["X-Proxy-Cache"], "HIT")
+        self.assertIn("Запись".encode(), response["body"])
+
+        caching.tags_purged.send(sender=None, tags=["post:0"])
+        self.assertIn("X-Proxy-Cache", self.request()["headers"])
+        caching.tags_purged.send(sender=None, tags=[f"post:{self.post.pk}"])
+        self.assertNotIn("X-Proxy-Cache", self.request()["headers"])
+
+    def test_compressed_and_plain_pages_are_kept_apart(self):
+        self.request()
+        compressed = self.request(HTTP_ACCEPT_ENCODING="gzip")
+        self.assertNotIn("X-Proxy-Cache", compressed["headers"])
+        self.assertEqual(compressed["headers"]["Content-Encoding"], "gzip")
+        plain = self.request()
+        self.assertEqual(plain["headers"]["X-Proxy-Cache"], "HIT")
+        self.assertNotIn("Content-Encoding", plain["headers"])
+        self.assertEqual(gzip.decompress(compressed["body"]), plain["body"])
+
+    def test_purge_request(self):
+        self.request()
+        response = self.request(
+            "PURGE", HTTP_SURROGATE_KEY=f"author:{self.author.pk} feed"
+        )
+        self.assertEqual(response["body"], b"1\n")
+        self.assertNotIn("X-Proxy-Cache", self.request()["headers"])
+
+    def test_requests_with_cookies_and_untagged_pages_pass(self):
+        self.request(HTTP_COOKIE="sessionid=1")
+        self.request(HTTP_COOKIE="sessionid=1")
+        self.assertNotIn("X-Proxy-Cache", self.request()["headers"])
+        self.request(url="/about/tech/")
+        response = self.request(url="/about/tech/")
+        self.assertNotIn("X-Proxy-Cache", response["headers"])
@@ -0,0 +1,54 @@
+import json
+import re
+
+from django.core.cache import cache
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connection
+from django.test import Client, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+
+from ..timing import ServerTimingMiddleware
+
+METRIC = re.compile(r'(\w+);dur=([\d.]+)(?:;desc="(\d+)")?')
+
+
+def metrics(response):
+    return {
+        name: (float(duration), int(count) if count else None)
+        for name, duration, count in METRIC.findall(response["Server-Timing"])
+    }
+
+
+@override_settings(SERVER_TIMING=True, SERVER_TIMING_LOG=False)
+class ServerTimingTest(TestCase):
+    def setUp(self):
+        cache.clear()
+
+    def test_header_counts_queries_cache_and_templates(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = Client().get("/")
+        timings = metrics(response)
+        self.assertEqual(set(timings), {"sql", "cache", "tpl", "total"})
+        self.assertEqual(timings["sql"][1], len(queries))
+        self.assertGreater(timings["cache"][1], 0)
+        # Вложенные шаблоны считаются вместе с внешним.
+        self.assertEqual(timings["tpl"][1], 1)
+        self.assertLessEqual(timings["sql"][0], timings["total"][0])
+
+    def test_log_line(self):
+        with override_settings(SERVER_TIMING_LOG=True), self.assertLogs(
+            "yatube.timing", "INFO"
+        ) as logs:
+            Client().get("/")
+        record = json.loads(logs.records[0].getMessage())
+        self.assertEqual(record["view"], "index")
+        self.assertEqual(record["status"], 200)
+        self.assertIn("sql_ms", record)
+        self.assertIn("tpl_count", record)
+
+    def test_disabled(self):
+        with override_settings(SERVER_TIMING=False):
+            with self.assertRaises(MiddlewareNotUsed):
+                ServerTimingMiddleware(lambda request: None)
+            response = Client().get("/")
+        self.assertFalse(response.has_header("Server-Timing"))
@@ -0,0 +1,154 @@
+"""Время, которое запрос провёл в SQL, кеше и шаблонах.
+
+``ServerTimingMiddleware`` считает обращения и их длительность и отдаёт
+итоги в заголовке ``Server-Timing`` (его показывают инструменты
+разработчика браузера), а при ``SERVER_TIMING_LOG`` ещё и строкой JSON
+в лог ``yatube.timing``. При ``SERVER_TIMING = False`` middleware
+выгружается при старте и ничего не перехватывает.
+"""
+
+import contextlib
+import contextvars
+import functools
+import json
+import logging
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+from django.template.base import Template
+
+logger = logging.getLogger("yatube.timing")
+
+CACHE_METHODS = (
+    "add",
+    "get",
+    "get_many",
+    "set",
+    "set_many",
+    "touch",
+    "delete",
+    "delete_many",
+    "has_key",
+    "incr",
+)
+
+_current = contextvars.ContextVar("timings", default=None)
+
+
+class Timings:
+    """Счётчики одного запроса."""
+
+    KINDS = ("sql", "cache", "tpl")
+
+    def __init__(self):
+        self.durations = dict.fromkeys(self.KINDS, 0.0)
+        self.counts = dict.fromkeys(self.KINDS, 0)
+        self._active = set()
+
+    @contextlib.contextmanager
+    def measure(self, kind):
+        # Вложенные вызовы (include внутри шаблона, get_many через get)
+        # уже учтены внешним.
+        if kind in self._active:
+            yield
+            return
+        self._active.add(kind)
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.durations[kind] += time.perf_counter() - start
+            self.counts[kind] += 1
+            self._active.discard(kind)
+
+    def header(self, total):
+        metrics = [
+            f"{kind};dur={self.durations[kind] * 1000:.1f};"
+            f'desc="{self.counts[kind]}"'
+            for kind in self.KINDS
+        ]
+        metrics.append(f"total;dur={total * 1000:.1f}")
+        return ", ".join(metrics)
+
+    def record(self, request, response, total):
+        match = request.resolver_match
+        record = {
+            "method": request.method,
+            "path": request.path,
+            "view": match.view_name if match else None,
+            "status": response.status_code,
+            "total_ms": round(total * 1000, 1),
+        }
+        for kind in self.KINDS:
+            record[f"{kind}_ms"] = round(self.durations[kind] * 1000, 1)
+            record[f"{kind}_count"] = self.counts[kind]
+        return record
+
+
+def _timed(kind, method):
+    @functools.wraps(method)
+    def wrapper(*args, **kwargs):
+        timings = _current.get()
+        if timings is None:
+            return method(*args, **kwargs)
+        with timings.measure(kind):
+            return method(*args, **kwargs)
+
+    wrapper.timed = True
+    return wrapper
+
+
+def _patch(cls, name, kind):
+    method = getattr(cls, name, None)
+    if method is None or getattr(method, "timed", False):
+        return
+    setattr(cls, name, _timed(kind, method))
+
+
+def install():
+    """Обернуть методы кешей и рендер шаблонов. Повторный вызов ничего
+    не делает.
+
+    Вне запроса обёртки сразу вызывают исходный метод.
+    """
+    for alias in settings.CACHES:
+        backend = type(caches[alias])
+        for name in CACHE_METHODS:
+            _patch(backend, name, "cache")
+    _patch(Template, "render", "tpl")
+
+
+def _execute(execute, sql, params, many, context):
+    timings = _current.get()
+    if timings is None:
+        return execute(sql, params, many, context)
+    with timings.measure("sql"):
+        return execute(sql, params, many, context)
+
+
+class ServerTimingMiddleware:
+    def __init__(self, get_response):
+        if not settings.SERVER_TIMING:
+            raise MiddlewareNotUsed
+        install()
+        self.get_response = get_response
+
+    def __call__(self, request):
+        timings = Timings()
+        token = _current.set(timings)
+        start = time.perf_counter()
+        try:
+            with contextlib.ExitStack() as stack:
+                for connection in connections.all():
+                    stack.enter_context(connection.execute_wrapper(_execute))
+                response = self.get_response(request)
+        finally:
+            _current.reset(token)
+        total = time.perf_counter() - start
+        response["Server-Timing"] = timings.header(total)
+        if settings.SERVER_TIMING_LOG:
+            logger.info(json.dumps(timings.record(request, response, total)))
+        return response
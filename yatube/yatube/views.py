@@ -10,4 +10,6 @@ def page_not_found(request, exception):
 
 
 def server_error(request):
-    return render(request, "misc/500.html", HTTPStatus.INTERNAL_SERVER_ERROR)
+    return render(
+        request, "misc/500.html", status=HTTPStatus.INTERNAL_SERVER_ERROR
+    )